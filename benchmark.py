@@ -0,0 +1,376 @@
+"""
+Performance benchmarks for the compiler
+
+usage: python benchmark.py [repeat]
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+
+from incrementalparse import IncrementalParser
+from parallelscan import scanParallel
+from parser import Parser
+from parsetrace import TraceLevel, TRACE_PATH
+from vectorscan import scanVectorized
+from scanner import Scanner, CHAR_CLASSES, LETTER, DIGIT, SPACE, NEWLINE
+from tokens import LineIndex
+import tokencache
+
+# one top level block of the simple-scala language, repeated to build large inputs
+SAMPLE_BODY = """abstract class {
+  val a, b, c : real;
+  def x (y, w) { y <=w; };
+  while (not ( true or false)) return (47 * (x + 25));
+}
+protected object {
+  val i, j, k : int;
+  if( @ x 25) case i = j + k * 5 => print (i);
+  else in (i, j, k);
+}
+private class {
+  val tt, ff : bool;
+  return (not (true or @ x 5) and false);
+}
+"""
+
+
+def generateSource(repeat):
+    """
+    write a source file made of the sample body repeated, returns its path
+    """
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(fd, "w") as output:
+        output.write("package a;\nimport b.c...67;\n#generated benchmark input\n")
+        output.write(SAMPLE_BODY * repeat)
+    return path
+
+
+def generateNested(depth):
+    """
+    write a source file with an expression nested depth parentheses deep,
+    returns its path
+    """
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(fd, "w") as output:
+        output.write("private class {\n  return (")
+        output.write("(" * depth + "1" + ")" * depth)
+        output.write(");\n}\n")
+    return path
+
+
+def benchScanner(path, engine="dfa", cache=False):
+    """
+    scan the whole file, returns (number of tokens, tokens per second)
+    """
+    start = time.perf_counter()
+    scanner = Scanner(path, engine, cache)
+    count = 0
+    while scanner.nextToken():
+        count += 1
+    elapsed = time.perf_counter() - start
+    return count, count / elapsed
+
+
+def benchScanBuffer(path):
+    """
+    scan the whole file into a TokenBuffer, returns (number of tokens, tokens per second)
+    """
+    start = time.perf_counter()
+    tokens = Scanner(path).scanBuffer()
+    elapsed = time.perf_counter() - start
+    return len(tokens), len(tokens) / elapsed
+
+
+def benchScanParallel(path, jobs=None):
+    """
+    scan the whole file with a process pool, returns (number of tokens, tokens per second)
+    """
+    start = time.perf_counter()
+    tokens = scanParallel(path, jobs)
+    elapsed = time.perf_counter() - start
+    return len(tokens), len(tokens) / elapsed
+
+
+def benchScanVectorized(path):
+    """
+    scan the whole file with the NumPy pre-pass, returns (number of tokens, tokens per second)
+    """
+    start = time.perf_counter()
+    tokens = scanVectorized(path)
+    elapsed = time.perf_counter() - start
+    return len(tokens), len(tokens) / elapsed
+
+
+def timeParse(path, trace=TraceLevel.FULL, engine="table"):
+    """
+    parse the file in a temporary directory, so that the parse_output.txt of
+    the project is left alone, returns the seconds taken
+    """
+    path = os.path.abspath(path)
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(directory)  # the parser writes parse_output.txt in the current directory
+    try:
+        start = time.perf_counter()
+        Parser().parsing(path, cache=False, trace=trace, engine=engine)
+        return time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        if os.path.exists(os.path.join(directory, TRACE_PATH)):
+            os.remove(os.path.join(directory, TRACE_PATH))
+        os.rmdir(directory)
+
+
+def benchParse(path, trace=TraceLevel.FULL, engine="table"):
+    """
+    parse the whole file, returns (number of tokens, tokens per second)
+    """
+    count = len(Scanner(path).scanBuffer())
+    return count, count / timeParse(path, trace, engine)
+
+
+def benchSyntaxTree(path):
+    """
+    parse the whole file with the trace off, with and without building the
+    syntax tree, then walk the tree. returns (number of nodes, bytes per node,
+    parse seconds, parse seconds with the tree, walked nodes per second)
+    """
+    start = time.perf_counter()
+    Parser().parsing(path, cache=False, trace=TraceLevel.OFF)
+    plain = time.perf_counter() - start
+
+    parser = Parser()
+    start = time.perf_counter()
+    parser.parsing(path, cache=False, trace=TraceLevel.OFF, buildTree=True)
+    withTree = time.perf_counter() - start
+
+    tree = parser.tree
+    size = sum(sys.getsizeof(column) for column in (tree.kinds, tree.firstChild, tree.nextSibling, tree.tokenIndex))
+    start = time.perf_counter()
+    for node, depth in tree.walk():
+        pass
+    walked = time.perf_counter() - start
+    return len(tree), size / len(tree), plain, withTree, len(tree) / walked
+
+
+def benchParseNesting(depths=(10, 100, 1000, 10000, 100000), engine="table"):
+    """
+    parse expressions of growing nesting depth, the parse stack grows with
+    the depth. returns (depth, seconds, microseconds per token) for each depth
+    """
+    results = []
+    for depth in depths:
+        path = generateNested(depth)
+        try:
+            elapsed = timeParse(path, engine=engine)
+        finally:
+            os.remove(path)
+        results.append((depth, elapsed, elapsed / (2 * depth + 10) * 1e6))
+    return results
+
+
+def benchParserReuse(count=2000):
+    """
+    parse count small sources given as strings with a new parser for each and
+    with one parser reset between them, returns the two sources per second
+    """
+    source = "package a;\n" + SAMPLE_BODY
+    start = time.perf_counter()
+    for i in range(count):
+        Parser().parsing(source, trace=TraceLevel.OFF, text=True)
+    fresh = count / (time.perf_counter() - start)
+
+    parser = Parser()
+    start = time.perf_counter()
+    for i in range(count):
+        parser.parsing(source, trace=TraceLevel.OFF, text=True)
+    return fresh, count / (time.perf_counter() - start)
+
+
+def benchIncrementalParse(repeats=(10, 100, 1000), edits=200):
+    """
+    type and delete a character of an identifier in the middle of sources
+    of growing size, returns (tokens, milliseconds per full parse,
+    milliseconds per edit) for each size
+    """
+    results = []
+    for repeat in repeats:
+        source = "package a;\n" + SAMPLE_BODY * repeat
+        parser = Parser()
+        start = time.perf_counter()
+        parser.parsing(source, trace=TraceLevel.OFF, text=True)
+        full = time.perf_counter() - start
+
+        incremental = IncrementalParser(source)
+        offset = source.index("tt,", len(source) // 2)
+        start = time.perf_counter()
+        for i in range(edits // 2):
+            incremental.edit(offset, 0, "x")
+            incremental.edit(offset, 1, "")
+        elapsed = time.perf_counter() - start
+        results.append((incremental.tokenCount(), full * 1000, elapsed / edits * 1000))
+    return results
+
+
+def benchLineIndex(path):
+    """
+    build the line index of the file and look up the position of every token,
+    returns (milliseconds to build the index, lookups per second)
+    """
+    buffer = Scanner(path).scanBuffer()
+    start = time.perf_counter()
+    index = LineIndex(buffer.source)
+    index.build()
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in buffer.starts:
+        index.position(offset)
+    elapsed = time.perf_counter() - start
+    return built * 1000, len(buffer) / elapsed
+
+
+def benchClassification(path):
+    """
+    classify every character of the file as letter, digit, space, newline or
+    other in three ways, returns the nanoseconds per character of each:
+    regular expression per character, chained comparisons, class table
+    """
+    with open(path, "rb") as source:
+        data = source.read()
+    text = data.decode("utf-8")
+
+    def byRegex():
+        counts = [0] * 5
+        for char in text:
+            if re.match("[a-zA-Z]", char):
+                counts[0] += 1
+            elif re.match("[0-9]", char):
+                counts[1] += 1
+            elif char == ' ' or char == '\t':
+                counts[2] += 1
+            elif char == '\n':
+                counts[3] += 1
+            else:
+                counts[4] += 1
+        return counts
+
+    def byComparisons():
+        counts = [0] * 5
+        for byte in data:
+            if 97 <= byte <= 122 or 65 <= byte <= 90:
+                counts[0] += 1
+            elif 48 <= byte <= 57:
+                counts[1] += 1
+            elif byte == 32 or byte == 9:
+                counts[2] += 1
+            elif byte == 10:
+                counts[3] += 1
+            else:
+                counts[4] += 1
+        return counts
+
+    def byTable():
+        counts = [0] * 5
+        classes = CHAR_CLASSES
+        for byte in data:
+            charClass = classes[byte]
+            if charClass == LETTER:
+                counts[0] += 1
+            elif charClass == DIGIT:
+                counts[1] += 1
+            elif charClass == SPACE:
+                counts[2] += 1
+            elif charClass == NEWLINE:
+                counts[3] += 1
+            else:
+                counts[4] += 1
+        return counts
+
+    results = []
+    for classify in (byRegex, byComparisons, byTable):
+        start = time.perf_counter()
+        classify()
+        results.append((time.perf_counter() - start) / len(data) * 1e9)
+    return results
+
+
+def tokenMemory(path):
+    """
+    returns the bytes used per token when kept as Token objects, as Token objects
+    once their lexeme has been read, and in a TokenBuffer
+    """
+    tokens = list(Scanner(path).tokens())
+    objects = sum(sys.getsizeof(token) for token in tokens)
+    withLexemes = sum(sys.getsizeof(token) + sys.getsizeof(token.lexeme) for token in tokens)
+
+    buffer = Scanner(path).scanBuffer()
+    columnar = sum(sys.getsizeof(column) for column in buffer.columns())
+
+    return objects / len(tokens), withLexemes / len(tokens), columnar / len(buffer)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    path = generateSource(repeat)
+    try:
+        for engine in Scanner.engines:
+            count, rate = benchScanner(path, engine)
+            print("{:<24}{:>12} tokens {:>14,.0f} tokens/sec".format("scanner " + engine, count, rate))
+        count, rate = benchScanBuffer(path)
+        print("{:<24}{:>12} tokens {:>14,.0f} tokens/sec".format("scanner buffer", count, rate))
+
+        count, rate = benchScanParallel(path)
+        print("{:<24}{:>12} tokens {:>14,.0f} tokens/sec".format("scanner parallel", count, rate))
+
+        try:
+            count, rate = benchScanVectorized(path)
+            print("{:<24}{:>12} tokens {:>14,.0f} tokens/sec".format("scanner vectorized", count, rate))
+        except ImportError as error:
+            print("{:<24}{:>12}".format("scanner vectorized", "skipped: %s" % error))
+
+        benchScanner(path, cache=True)  # fill the token cache
+        count, rate = benchScanner(path, cache=True)
+        print("{:<24}{:>12} tokens {:>14,.0f} tokens/sec".format("scanner cached", count, rate))
+
+        for engine in Parser.engines:
+            for trace in (TraceLevel.FULL, TraceLevel.OFF):
+                count, rate = benchParse(path, trace, engine)
+                print("{:<24}{:>12} tokens {:>14,.0f} tokens/sec".format(
+                      "parser %s trace %s" % (engine, trace.name.lower()), count, rate))
+        nodes, perNode, plain, withTree, walkRate = benchSyntaxTree(path)
+        print("{:<24}{:>12} nodes {:>15.1f} bytes/node".format("syntax tree", nodes, perNode))
+        print("{:<24}{:>12.3f} s {:>19.3f} s with tree".format("syntax tree parse", plain, withTree))
+        print("{:<24}{:>12,.0f} nodes/sec".format("syntax tree walk", walkRate))
+        for engine in Parser.engines:
+            for depth, elapsed, perToken in benchParseNesting(engine=engine):
+                print("{:<24}{:>12.3f} s {:>17.2f} us/token".format("%s depth %d" % (engine, depth), elapsed, perToken))
+
+        fresh, reused = benchParserReuse()
+        print("{:<24}{:>12,.0f} sources/sec {:>10,.0f} sources/sec reused".format("parser reuse", fresh, reused))
+
+        for count, full, edit in benchIncrementalParse():
+            print("{:<24}{:>12} tokens {:>10.3f} ms/parse {:>10.3f} ms/edit".format("incremental parse", count, full, edit))
+
+        built, rate = benchLineIndex(path)
+        print("{:<24}{:>12.1f} ms to build {:>14,.0f} lookups/sec".format("line index", built, rate))
+
+        regex, comparisons, table = benchClassification(path)
+        print("{:<24}{:>12.1f} ns/char (regex per character)".format("classification", regex))
+        print("{:<24}{:>12.1f} ns/char (chained comparisons)".format("classification", comparisons))
+        print("{:<24}{:>12.1f} ns/char (class table)".format("classification", table))
+
+        objects, withLexemes, columnar = tokenMemory(path)
+        print("{:<24}{:>12.1f} bytes/token (Token objects)".format("token memory", objects))
+        print("{:<24}{:>12.1f} bytes/token (Token objects, lexemes read)".format("token memory", withLexemes))
+        print("{:<24}{:>12.1f} bytes/token (TokenBuffer)".format("token memory", columnar))
+    finally:
+        os.remove(path)
+        if os.path.exists(tokencache.cachePath(path)):
+            os.remove(tokencache.cachePath(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -18,8 +18,14 @@ class Bookkeeper:
         """
         self.symtab[token.lexeme] = token.type  # insert new entry
 
-    def printTable(self): # print the symbol table to a file
-        with open("symbolTable.txt", "w") as output:
+    def clear(self):
+        """
+        remove every entry, the table is reused for the next source
+        """
+        self.symtab.clear()
+
+    def printTable(self, path="symbolTable.txt"): # print the symbol table to a file
+        with open(path, "w") as output:
             output.write ("Symbol Table\n")
             output.write ('{0:<8}{1:>12}\n'.format("Symbol", "Type"))
             output.write ("-"*25+"\n")
@@ -0,0 +1,113 @@
+"""
+Client of the compile daemon (python compiler.py --serve)
+
+Only the standard socket and json modules are imported, so a request costs
+little more than the parse done by the daemon.
+
+usage: python compileclient.py [--socket PATH] [--engine ENGINE] file...  (- reads source code from stdin)
+"""
+import errno
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+
+
+def defaultSocketPath():
+    """
+    returns the socket path of the compile daemon of the user, in the
+    private $XDG_RUNTIME_DIR or else in a compiler-<uid> directory of the
+    temporary directory, made private by the daemon
+    """
+    directory = os.environ.get("XDG_RUNTIME_DIR")
+    if not directory or not os.path.isdir(directory):
+        directory = os.path.join(tempfile.gettempdir(), "compiler-%d" % os.getuid())
+    return os.path.join(directory, "compiler.sock")
+
+
+# Unix domain socket of the compile daemon
+SOCKET_PATH = defaultSocketPath()
+
+
+def checkSocketPath(path):
+    """
+    raise PermissionError unless only the user can have put a socket at
+    path: its directory is the user's and not writable by other users (or a
+    sticky directory of root, like /tmp), and a socket already there is the
+    user's
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    info = os.stat(directory)
+    sticky = info.st_mode & stat.S_ISVTX
+    if info.st_uid == os.getuid():
+        if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH) and not sticky:
+            raise PermissionError(errno.EPERM, "socket directory writable by other users", directory)
+    elif not (info.st_uid == 0 and sticky):
+        raise PermissionError(errno.EPERM, "socket directory owned by another user", directory)
+
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if stat.S_ISSOCK(info.st_mode) and info.st_uid != os.getuid():
+        raise PermissionError(errno.EPERM, "socket owned by another user", path)
+
+
+def request(requests, path=SOCKET_PATH):
+    """
+    send requests to the compile daemon, {"path": ...} or {"source": ...}
+    with an optional "engine", returns the replies in order. the socket is
+    checked with checkSocketPath first
+    """
+    checkSocketPath(path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall(b"".join(json.dumps(item).encode("utf-8") + b"\n" for item in requests))
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile("rb") as replies:
+            return [json.loads(reply) for reply in replies]
+
+
+def makeRequests(paths, engine="table"):
+    """
+    returns the requests of source files, - is the source code read from stdin
+    """
+    requests = []
+    for path in paths:
+        if path == "-":
+            requests.append({"source": sys.stdin.read(), "engine": engine})
+        else:
+            requests.append({"path": os.path.abspath(path), "engine": engine})
+    return requests
+
+
+def main(arguments=None):
+    arguments = sys.argv[1:] if arguments is None else arguments
+    path = SOCKET_PATH
+    engine = "table"
+    while arguments[:1] in (["--socket"], ["--engine"]) and len(arguments) > 1:
+        if arguments[0] == "--socket":
+            path = arguments[1]
+        else:
+            engine = arguments[1]
+        arguments = arguments[2:]
+    if not arguments:
+        print ("usage: python compileclient.py [--socket PATH] [--engine ENGINE] file...")
+        sys.exit(2)
+
+    try:
+        replies = request(makeRequests(arguments, engine), path)
+    except OSError as error:
+        print ("cannot reach the compile daemon: %s" % error)
+        sys.exit(2)
+    rejected = 0
+    for reply in replies:
+        print (json.dumps(reply))
+        rejected += not reply.get("accepted")
+    sys.exit(1 if rejected else 0)
+
+
+if __name__ == '__main__':
+    main()
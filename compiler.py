@@ -3,19 +3,343 @@ CS 4323 Programming Assignment #2
 Compiler Parser
 
 Author: Lingzhou Lu
+
+usage: python compiler.py                  (parse source.txt)
+       python compiler.py [-j N] [-o DIR] [--cache-dir DIR | --no-cache] [--engine ENGINE] [--trace LEVEL] file...
+       python compiler.py --serve [--socket PATH] [-j N] [--cache-dir DIR]
+       python compiler.py --client [--socket PATH] file...  (- reads source code from stdin)
+
+the client of the daemon is compileclient.py, which starts faster than
+python compiler.py --client
 """
-from parser import Parser
+import argparse
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import errno
+import io
+import json
+import multiprocessing
+import os
+import socket
+import stat
+import sys
+
+import compileclient
+from compileclient import SOCKET_PATH, checkSocketPath
+from parser import Parser, Diagnostic
+from parsetrace import TraceLevel
+import tokencache
 
 sourceFile = "source.txt"
+
+MAX_REQUEST = 1 << 26  # longest request line of the compile daemon, source code included
+
+# result of the compilation of one source file: symbols are the (lexeme, type)
+# entries of its symbol table
+CompileResult = namedtuple("CompileResult", "path accepted diagnostics symbols tracePath symtabPath")
+
+
+def outputPaths(path, outputDir=None, root=None):
+    """
+    returns the parse trace and symbol table paths of a source file, named
+    after its whole file name as name.ext.parse_output.txt and
+    name.ext.symbolTable.txt: next to it, or in outputDir at the path of the
+    source file relative to the root directory (its own directory by default)
+    """
+    base = path
+    if outputDir is not None:
+        path = os.path.abspath(path)
+        base = os.path.join(outputDir, os.path.relpath(path, root or os.path.dirname(path)))
+    return base + ".parse_output.txt", base + ".symbolTable.txt"
+
+
+# parser of the process, reused from one file to the next
+workerParser = None
+# token cache of the path requests of a daemon worker, see Parser.parsing
+workerCache = False
+
+
+def compileFile(path, outputDir=None, trace=TraceLevel.FULL, engine="table", root=None, cache=True):
+    """
+    parse one source file and write its trace and symbol table, the messages
+    of the parser are not printed but returned as diagnostics. cache is the
+    token cache of Parser.parsing
+    """
+    global workerParser
+    if workerParser is None:
+        workerParser = Parser()
+    parser = workerParser
+
+    tracePath, symtabPath = outputPaths(path, outputDir, root)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            accepted = parser.parsing(path, cache=cache, trace=trace, tracePath=tracePath, engine=engine)
+        parser.symtab.printTable(symtabPath)
+    except OSError as error:
+        return CompileResult(path, False, [Diagnostic(None, None, "", str(error))], [], None, None)
+    return CompileResult(path, accepted, parser.diagnostics, list(parser.symtab.symtab.items()),
+                         tracePath if trace else None, symtabPath)
+
+
+def compile_many(paths, jobs=None, outputDir=None, trace=TraceLevel.FULL, engine="table", cache=True):
+    """
+    compile source files in a pool of jobs processes (all the processors by
+    default), returns their CompileResult in the order of paths. in outputDir
+    the outputs keep the paths of the sources below their common directory,
+    a source file given twice is a ValueError. cache is True (the token cache
+    is in outputDir, or next to the sources without one), False or the
+    directory of the token cache
+    """
+    paths = list(paths)
+    seen = set()
+    for path in paths:
+        realPath = os.path.realpath(path)
+        if realPath in seen:
+            raise ValueError("source file given twice: %s" % path)
+        seen.add(realPath)
+
+    if cache is True and outputDir is not None:
+        cache = os.path.join(outputDir, tokencache.CACHE_DIR)
+    root = None
+    if outputDir is not None and paths:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+        for path in paths:
+            os.makedirs(os.path.dirname(outputPaths(path, outputDir, root)[0]), exist_ok=True)
+    count = len(paths)
+    if jobs == 1 or count < 2:
+        return [compileFile(path, outputDir, trace, engine, root, cache) for path in paths]
+
+    jobs = min(jobs or os.cpu_count() or 1, count)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(compileFile, paths, [outputDir] * count, [trace] * count,
+                                 [engine] * count, [root] * count, [cache] * count,
+                                 chunksize=max(1, count // (jobs * 4))))
+
+
+def requestError(request):
+    """
+    returns what is wrong with a daemon request, None when it is well formed
+    """
+    if not isinstance(request, dict):
+        return "a request is a JSON object"
+    if "source" in request:
+        if not isinstance(request["source"], str):
+            return "source is a string"
+    elif "path" in request:
+        if not isinstance(request["path"], str):
+            return "path is a string"
+    else:
+        return "a request has a source or a path"
+    if request.get("engine", "table") not in Parser.engines:
+        return "engine is one of %s" % ", ".join(Parser.engines)
+    return None
+
+
+def compileRequest(request):
+    """
+    parse the source of a daemon request, {"path": ...} or {"source": ...}
+    with an optional "engine", returns the reply
+    """
+    error = requestError(request)
+    if error is not None:
+        return {"error": "bad request: %s" % error}
+
+    global workerParser
+    if workerParser is None:
+        workerParser = Parser()
+    parser = workerParser
+
+    engine = request.get("engine", "table")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if "source" in request:
+                accepted = parser.parsing(request["source"], cache=False, trace=TraceLevel.OFF,
+                                          engine=engine, text=True)
+            else:
+                accepted = parser.parsing(request["path"], cache=workerCache, trace=TraceLevel.OFF, engine=engine)
+    except (OSError, KeyError, ValueError, TypeError) as error:
+        return {"error": "%s: %s" % (type(error).__name__, error)}
+    return {"accepted": accepted,
+            "diagnostics": [diagnostic._asdict() for diagnostic in parser.diagnostics],
+            "symbols": list(parser.symtab.symtab.items())}
+
+
+def warmWorker(cache=False):
+    """
+    load the parser tables of a daemon worker before its first request
+    """
+    global workerParser, workerCache
+    workerParser = Parser()
+    workerCache = cache
+
+
+async def answer(line, executor):
+    """
+    returns the reply to a request line, parsed in a worker process
+    """
+    try:
+        request = json.loads(line)
+    except ValueError as error:
+        return {"error": "bad request: %s" % error}
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, compileRequest, request)
+    except Exception as error:
+        return {"error": "%s: %s" % (type(error).__name__, error)}
+
+
+async def serveClient(reader, writer, executor):
+    """
+    answer the requests of a client connection, one JSON object per line
+    each way. every request line is parsed as soon as it is read, so a slow
+    file does not hold up the parse of the next ones, and the replies are
+    written in the order of the requests
+    """
+    replies = asyncio.Queue()  # reply task of every request line, None at the end
+
+    async def writeReplies():
+        while True:
+            task = await replies.get()
+            if task is None:
+                break
+            writer.write(json.dumps(await task).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    writing = asyncio.ensure_future(writeReplies())
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            replies.put_nowait(asyncio.ensure_future(answer(line, executor)))
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+        pass  # client gone or request line too long
+    finally:
+        replies.put_nowait(None)
+        try:
+            await writing
+        except ConnectionError:
+            pass  # client gone
+        writer.close()
+
+
+def claimSocket(path):
+    """
+    make the private directory of the socket when missing and remove the
+    socket left at path by a daemon that did not stop cleanly. raises OSError
+    when the path fails checkSocketPath, a daemon still answers on it or
+    path is not a socket
+    """
+    try:
+        os.mkdir(os.path.dirname(os.path.abspath(path)), 0o700)
+    except FileExistsError:
+        pass
+    checkSocketPath(path)
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(errno.EEXIST, "not a socket", path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.remove(path)  # nobody listening
+            return
+        except FileNotFoundError:
+            return
+    raise OSError(errno.EADDRINUSE, "a compile daemon is already listening", path)
+
+
+async def serve(path=SOCKET_PATH, jobs=None, cache=False):
+    """
+    run the compile daemon on a Unix domain socket until interrupted, the
+    files of path requests use the token cache directory cache when given
+    """
+    claimSocket(path)
+    # the workers are forked from a fork server that has the parser imported:
+    # forked from the daemon they would inherit the sockets of its clients
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["parser"])
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=warmWorker,
+                             initargs=(cache,)) as executor:
+        # only the user may connect: a request reads files with the rights of the daemon
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(lambda reader, writer: serveClient(reader, writer, executor),
+                                                     path, limit=MAX_REQUEST)
+        finally:
+            os.umask(umask)
+        print ("compile daemon listening on %s" % path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            os.remove(path)
+
+
 def main():
-    # call parser
-    parser = Parser()
+    if len(sys.argv) == 1:
+        # call parser
+        parser = Parser()
+
+        # start LL(1) parsing
+        parser.parsing(sourceFile)
+
+        # print out symbol table
+        parser.symtab.printTable()
+        return
+
+    arguments = argparse.ArgumentParser(description="Parse simple-scala source files.")
+    arguments.add_argument("paths", nargs="*", help="source files")
+    arguments.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (all processors)")
+    arguments.add_argument("-o", "--output-dir", default=None,
+                           help="directory of the outputs (next to every source file)")
+    arguments.add_argument("--engine", choices=Parser.engines, default="table")
+    arguments.add_argument("--trace", choices=[level.name.lower() for level in TraceLevel], default="full")
+    arguments.add_argument("--serve", action="store_true", help="run the compile daemon")
+    arguments.add_argument("--client", action="store_true", help="send the files to the compile daemon")
+    arguments.add_argument("--socket", default=SOCKET_PATH, help="socket of the daemon (%(default)s)")
+    caching = arguments.add_mutually_exclusive_group()
+    caching.add_argument("--cache-dir", default=None,
+                         help="directory of the token cache (in the output directory, or next to every source file)")
+    caching.add_argument("--no-cache", action="store_true", help="do not use the token cache")
+    options = arguments.parse_args()
+    cacheDir = os.path.abspath(options.cache_dir) if options.cache_dir else None
 
-    # start LL(1) parsing
-    parser.parsing(sourceFile)
+    if options.serve:
+        try:
+            asyncio.run(serve(options.socket, options.jobs, cacheDir or False))
+        except KeyboardInterrupt:
+            pass
+        except OSError as error:
+            print ("cannot start the compile daemon: %s" % error)
+            sys.exit(1)
+        return
+    if not options.paths:
+        arguments.error("no source files")
+    if options.client:
+        compileclient.main(["--socket", options.socket, "--engine", options.engine] + options.paths)
 
-    # print out symbol table
-    parser.symtab.printTable()
+    try:
+        results = compile_many(options.paths, options.jobs, options.output_dir,
+                               TraceLevel[options.trace.upper()], options.engine,
+                               False if options.no_cache else cacheDir or True)
+    except ValueError as error:
+        arguments.error(str(error))
+    rejected = 0
+    for result in results:
+        print ("%s: %s" % (result.path, "accepted" if result.accepted else "rejected"))
+        for diagnostic in result.diagnostics:
+            if diagnostic.line is None:
+                print ("  %s" % diagnostic.message)
+            else:
+                print ("  line %s: %s" % (diagnostic.line, diagnostic.message))
+        rejected += not result.accepted
+    print ("%d files, %d rejected" % (len(results), rejected))
+    sys.exit(1 if rejected else 0)
 
 
 if __name__ == '__main__':
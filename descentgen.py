@@ -0,0 +1,250 @@
+"""
+Recursive-descent parser generator
+
+The grammar rules and the LL(1) parse table are turned into a Python module
+with one parse_ method per non-terminal: the method picks the rule of the
+lookahead with an if chain built from the parse table, then matches the
+terminals and calls the methods of the non-terminals of the rule body. A rule
+ending with its own non-terminal, like <stmts> -> <stmt> ; <stmts>, loops
+instead of recursing so long lists of statements do not grow the call stack.
+
+The generated parser reports the same trace steps as the table-driven loop
+of Parser.parsing. It stops at the first syntax error without reporting it,
+Parser.parsing then parses again with the table loop which recovers from the
+errors and reports them. The module is cached next to this one and only
+generated again when the grammar hash changes.
+
+usage: python descentgen.py  (prints the generated module)
+"""
+import importlib.util
+import os
+import types
+
+from terminals import TOKEN_LOOKUP, Terminal
+import parsetrace
+import tablegen
+from tablegen import EPSILON, START_SYMBOL
+
+# bump when the generated code changes for the same grammar
+DESCENTGEN_VERSION = 2
+
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "descent_parser.py")
+
+
+class ParseError(Exception):
+    """
+    raised by the generated parser to stop at a syntax error or invalid token
+    """
+
+
+class DescentParser:
+    """
+    runtime of the generated parser: matching, trace steps and syntax tree
+    nodes. the generated subclass adds the parse_ methods
+    """
+    def __init__(self, parser, nextToken, output=None, trace=parsetrace.TraceLevel.OFF, tree=None, nodes=None):
+        self.parser = parser  # Parser keeping the symbol table
+        self.nextToken = nextToken
+        self.output = output
+        self.traceRules = trace >= parsetrace.TraceLevel.RULES
+        self.traceMatches = trace >= parsetrace.TraceLevel.FULL
+        self.tree = tree
+        self.nodes = nodes  # tree node of every pending symbol, as in the table loop
+        self.step = 1
+        self.tokenIndex = 0
+        self.token = None
+        self.lookahead = -1
+
+    def parse(self):
+        """
+        parse the whole token stream, returns True when it is accepted and
+        False at the first syntax error
+        """
+        if self.traceRules:
+            self.output.step(self.step, 0, -1, parsetrace.START)
+        self.step += 1
+        self.token = self.nextToken()
+        self.lookahead = self.token.code  # an invalid token (-1) is a syntax error
+        try:
+            self.parse_scala()
+            if self.lookahead != Terminal.END:
+                self.fail(0)  # input left after <scala>
+        except ParseError:
+            return False
+        if self.traceRules:
+            self.output.step(self.step, 0, -1, parsetrace.ACCEPT)
+        return True
+
+    def rule(self, head, ruleNum):
+        """
+        expand the non-terminal head by a rule
+        """
+        if self.traceRules:
+            self.output.step(self.step, head, self.lookahead, ruleNum)
+        self.step += 1
+        if self.tree is not None:
+            self.tree.expand(self.nodes.pop(), self.parser.rule_bodies[ruleNum], self.nodes)
+
+    def match(self, terminal):
+        """
+        match the lookahead with a terminal and read the next token
+        """
+        lookahead = self.lookahead
+        if lookahead != terminal:
+            raise ParseError(terminal)
+        if self.traceMatches:
+            self.output.step(self.step, terminal, lookahead, parsetrace.MATCH)
+        self.step += 1
+        if self.tree is not None:
+            self.tree.tokenIndex[self.nodes.pop()] = self.tokenIndex
+        self.tokenIndex += 1
+
+        token = self.token = self.nextToken()
+        lookahead = self.lookahead = token.code
+        if lookahead == Terminal.ID or lookahead == Terminal.CONST:
+            self.parser.symtab.insert(token)
+
+    def advance(self, terminal):
+        """
+        match without trace steps and tree nodes, used by the untraced parser
+        """
+        if self.lookahead != terminal:
+            raise ParseError(terminal)
+        token = self.token = self.nextToken()
+        lookahead = self.lookahead = token.code
+        if lookahead == Terminal.ID or lookahead == Terminal.CONST:
+            self.parser.symtab.insert(token)
+
+    def fail(self, head):
+        """
+        no rule of head for the lookahead
+        """
+        raise ParseError(head)
+
+
+def methodName(symbol):
+    """
+    returns the name of the parse method of a non-terminal, <subbody-tail> is
+    parse_subbody_tail
+    """
+    return "parse_" + TOKEN_LOOKUP[symbol].strip("<>").replace("-", "_")
+
+
+def condition(lookaheads):
+    """
+    returns the test of the lookahead selecting a rule
+    """
+    if len(lookaheads) == 1:
+        return "lookahead == %d" % lookaheads[0]
+    return "lookahead in (%s)" % ", ".join(str(lookahead) for lookahead in lookaheads)
+
+
+def generateMethod(head, rule_heads, syntax_rules, parse_table, traced=True):
+    """
+    returns the lines of the parse method of a non-terminal, an untraced
+    method does not report the rules and matches with advance
+    """
+    rules = {}  # rule number -> lookaheads selecting it
+    for lookahead, ruleNum in sorted(parse_table[head].items()):
+        rules.setdefault(ruleNum, []).append(lookahead)
+    bodies = dict((ruleNum, [item for item in syntax_rules[ruleNum] if item != EPSILON]) for ruleNum in rules)
+    loop = any(body and body[-1] == head for body in bodies.values())
+    indent = "            " if loop else "        "
+
+    lines = ["    def %s(self):" % methodName(head),
+             "        # %s" % TOKEN_LOOKUP[head]]
+    if loop:
+        lines.append("        while True:")
+    lines.append(indent + "lookahead = self.lookahead")
+    for i, ruleNum in enumerate(sorted(rules, key=lambda ruleNum: rules[ruleNum])):
+        body = bodies[ruleNum]
+        lines.append(indent + ("if " if i == 0 else "elif ") + condition(rules[ruleNum]) + ":")
+        if traced:
+            lines.append(indent + "    self.rule(%d, %d)  # %s" % (head, ruleNum,
+                         " ".join(TOKEN_LOOKUP[item] for item in body) or "epsilon"))
+        elif body:
+            lines.append(indent + "    # rule %d: %s" % (ruleNum, " ".join(TOKEN_LOOKUP[item] for item in body)))
+        else:
+            lines.append(indent + "    pass  # rule %d: epsilon" % ruleNum)
+        tail = loop and body and body[-1] == head
+        for item in body[:-1] if tail else body:
+            if item in parse_table:
+                lines.append(indent + "    self.%s()" % methodName(item))
+            else:
+                lines.append(indent + "    self.%s(%d)  # %s" % ("match" if traced else "advance", item, TOKEN_LOOKUP[item]))
+        if tail:
+            lines.append(indent + "    continue  # %s" % TOKEN_LOOKUP[head])
+    lines.append(indent + "else:")
+    lines.append(indent + "    self.fail(%d)" % head)
+    if loop:
+        lines.append(indent + "return")
+    return lines
+
+
+def grammarHash(rule_heads, syntax_rules):
+    """
+    returns the hash of the grammar and of the generator version, as text
+    """
+    return "%d-%s" % (DESCENTGEN_VERSION, tablegen.grammarHash(rule_heads, syntax_rules).hex())
+
+
+def generateSource(rule_heads, syntax_rules, parse_table):
+    """
+    returns the source of the generated parser module
+    """
+    lines = ["# generated by descentgen.py from the grammar of Parser, do not edit",
+             "# grammar %s" % grammarHash(rule_heads, syntax_rules),
+             "from descentgen import DescentParser"]
+    heads = [START_SYMBOL] + [symbol for symbol in sorted(parse_table) if symbol != START_SYMBOL]
+    for name, traced, doc in (("GeneratedParser", True, "reports the trace steps and builds the syntax tree"),
+                              ("FastParser", False, "without trace and syntax tree")):
+        lines.extend(["", "", "class %s(DescentParser):" % name,
+                      "    \"\"\"",
+                      "    recursive-descent parser, one parse_ method per non-terminal, %s" % doc,
+                      "    \"\"\""])
+        for head in heads:
+            lines.extend(generateMethod(head, rule_heads, syntax_rules, parse_table, traced))
+            lines.append("")
+    return "\n".join(lines)
+
+
+def loadParser(rule_heads, syntax_rules, parse_table, path=CACHE_FILE):
+    """
+    returns the generated parser module from the cache, the module is
+    generated and cached again when the grammar changed
+    """
+    header = "# grammar %s\n" % grammarHash(rule_heads, syntax_rules)
+    try:
+        with open(path) as cache:
+            cache.readline()
+            cached = cache.readline() == header
+    except OSError:
+        cached = False  # no cache yet
+
+    if not cached:
+        source = generateSource(rule_heads, syntax_rules, parse_table)
+        try:
+            temp = path + ".%d" % os.getpid()
+            with open(temp, "w") as cache:
+                cache.write(source)
+            os.replace(temp, path)
+        except OSError:
+            pass  # read-only install, the module is generated at every start
+        module = types.ModuleType("descent_parser")
+        exec(compile(source, path, "exec"), module.__dict__)
+        return module
+
+    # import the cached module, its byte code is cached by Python as well
+    spec = importlib.util.spec_from_file_location("descent_parser", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    from parser import Parser
+    print (generateSource(Parser.rule_heads, Parser.syntax_rules, Parser.parse_table))
+
+
+if __name__ == '__main__':
+    main()
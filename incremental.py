@@ -0,0 +1,196 @@
+"""
+Incremental scanning for editor integration
+
+An edit only re-scans the tokens around the edited region: scanning restarts
+after the last token that ends before the edit, and stops as soon as a new
+token starts where an old token (moved by the edit) started, since from there
+on the scanner produces exactly the old tokens again.
+"""
+from bisect import bisect_right
+
+from scanner import Scanner
+from tokens import Token, LineIndex, LINE_BREAK
+
+# number of pending offset shifts kept before they are applied to every token
+MAX_PENDING_SHIFTS = 1024
+
+
+class IncrementalScanner:
+    """
+    Keeps the token list of an edited source buffer up to date.
+    Tokens after an edit are not touched: their offset and line shifts are
+    recorded as pending (token index, offset delta, line delta) entries that
+    apply to every token from that index on, and are folded in by tokens()
+    """
+    def __init__(self, source, engine="dfa"):
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        self.engine = engine
+        self.source = bytearray(source)
+        # tokens read their lexeme from the source code, so the first scan is
+        # done on a copy that edits don't change
+        self.tokenList = list(Scanner(bytes(self.source), engine))
+        self.lineIndex = LineIndex(self.source)  # built again after every edit
+        self.pending = []  # (index, offset delta, line delta), sorted by index
+        self.indices = []  # token index of each pending shift
+        self.totals = [(0, 0)]  # sums of the first k pending shifts
+
+    def setPending(self, pending):
+        """
+        replace the pending shifts and their running sums
+        """
+        self.pending = pending
+        self.indices = [index for index, offset, lines in pending]
+        self.totals = [(0, 0)]
+        offsetDelta = lineDelta = 0
+        for index, offset, lines in pending:
+            offsetDelta += offset
+            lineDelta += lines
+            self.totals.append((offsetDelta, lineDelta))
+
+    def shift(self, i):
+        """
+        returns the (offset delta, line delta) still to apply to the i-th token
+        """
+        return self.totals[bisect_right(self.indices, i)]
+
+    def token(self, i):
+        """
+        returns the i-th token with up to date offsets and line number
+        """
+        token = self.tokenList[i]
+        offsetDelta, lineDelta = self.shift(i)
+        if not offsetDelta and not lineDelta:
+            return token
+        moved = Token(token.lexeme, token.type, token.lineNum + lineDelta,
+                      token.start + offsetDelta, token.end + offsetDelta, code=token.code)
+        moved.lexicalError = token.lexicalError
+        return moved
+
+    def position(self, offset):
+        """
+        returns the (line, column) pair of a byte offset of the edited source
+        """
+        return self.lineIndex.position(offset)
+
+    def tokens(self):
+        """
+        returns the up to date token list, applying the pending shifts
+        """
+        if self.pending:
+            for i in range(len(self.tokenList)):
+                self.tokenList[i] = self.token(i)
+            self.setPending([])
+        return self.tokenList
+
+    def edit(self, offset, deleted, inserted):
+        """
+        replace deleted bytes at offset by the inserted text and re-scan the
+        affected tokens. returns (first, oldEnd, newEnd): tokens first to oldEnd
+        of the previous token list were replaced by tokens first to newEnd
+        """
+        if isinstance(inserted, str):
+            inserted = inserted.encode("utf-8")
+        self.source[offset:offset + deleted] = inserted
+        self.lineIndex = LineIndex(self.source)
+        delta = len(inserted) - deleted
+
+        # restart after the last token ending strictly before the edit,
+        # a token touching the edit may be extended by it
+        low, high = 0, len(self.tokenList)
+        while low < high:
+            middle = (low + high) // 2
+            if self.tokenList[middle].end + self.shift(middle)[0] < offset:
+                low = middle + 1
+            else:
+                high = middle
+        first = low
+        if first > 0:
+            previous = self.token(first - 1)
+            position, lineNum = previous.end, previous.lineNum
+        else:
+            position, lineNum = 0, 1
+
+        scanner = Scanner(self.source, self.engine)
+        scanner.seek(position)
+
+        # scan until a new token starts at the moved start of an old token
+        # that was entirely after the edited region
+        newTokens = []
+        old = first
+        lineDelta = None
+        for token in scanner:
+            # count the lines from the previous token, the index of the whole
+            # edited source is not built for every edit
+            lineNum += len(LINE_BREAK.findall(self.source, position, token.start))
+            position = token.start
+            token.lineNum = lineNum
+            while old < len(self.tokenList):
+                oldToken = self.token(old)
+                if oldToken.start < offset + deleted:
+                    old += 1
+                elif oldToken.start + delta < token.start:
+                    old += 1
+                else:
+                    break
+            else:
+                newTokens.append(token)
+                continue
+
+            if oldToken.start + delta == token.start:
+                lineDelta = token.lineNum - oldToken.lineNum
+                break
+            newTokens.append(token)
+        else:
+            old = len(self.tokenList)  # end of the file reached, no old token left
+        scanner.close()
+
+        # the edited buffer will change again, new tokens copy their lexeme now
+        for token in newTokens:
+            token.lexeme
+            token.index = None
+
+        self.splice(first, old, newTokens, delta, lineDelta)
+        return first, old, first + len(newTokens)
+
+    def splice(self, first, old, newTokens, delta, lineDelta):
+        """
+        replace tokens first to old by the new tokens and record the shift of
+        the tokens after them
+        """
+        # new tokens are stored without the shifts pending before them
+        offsetShift, lineShift = self.shift(first)
+        if offsetShift or lineShift:
+            for token in newTokens:
+                token.start -= offsetShift
+                token.end -= offsetShift
+                token.lineNum -= lineShift
+
+        # shifts recorded inside the replaced tokens now start after them
+        grown = len(newTokens) - (old - first)
+        length = len(self.tokenList) + grown
+        pending = []
+        for index, offset, lines in self.pending:
+            if index > first:
+                index = max(index, old) + grown
+            if index < length:
+                pending.append((index, offset, lines))
+        if lineDelta is not None and (delta or lineDelta):
+            pending.append((old + grown, delta, lineDelta))
+        pending.sort(key=lambda entry: entry[0])
+
+        # shifts starting at the same token add up, typing keeps a single entry
+        merged = []
+        for index, offset, lines in pending:
+            if merged and merged[-1][0] == index:
+                offset += merged[-1][1]
+                lines += merged[-1][2]
+                merged.pop()
+            if offset or lines:
+                merged.append((index, offset, lines))
+        pending = merged
+
+        self.tokenList[first:old] = newTokens
+        self.setPending(pending)
+        if len(self.pending) > MAX_PENDING_SHIFTS:
+            self.tokens()
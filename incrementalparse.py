@@ -0,0 +1,216 @@
+"""
+Incremental parsing for editor integration
+
+A program is its <packages> and <imports> followed by top-level <subbody>
+blocks, and a modifier (abstract, final, sealed, private, protected) only
+appears at the start of a subbody. The token stream is cut before every
+modifier: the header and every subbody are each a whole program for the
+parser, and the source is accepted exactly when all of them are.
+
+An edit re-scans its tokens with the IncrementalScanner, then only the
+pieces whose tokens it replaced are parsed again. The results of the other
+pieces are kept, their diagnostics are moved by the lines the edit added or
+removed, and the symbol table is merged from the pieces in source order.
+"""
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+
+from incremental import IncrementalScanner
+from parser import Parser
+from parsetrace import TraceLevel
+from terminals import Terminal
+from tokens import Token, LINE_BREAK
+
+# terminal codes starting a top-level subbody
+MODIFIERS = frozenset((Terminal.ABSTRACT, Terminal.FINAL, Terminal.SEALED, Terminal.PRIVATE, Terminal.PROTECTED))
+
+# parse result of one piece of the source, baseLine is the line of its first
+# token when it was parsed
+PieceResult = namedtuple("PieceResult", "accepted diagnostics symbols baseLine")
+
+
+class SourceColumns:
+    """
+    Lines and columns of the tokens of an edited source, with the interface
+    of LineIndex: a column is found from the line break before its offset
+    and the line index of the whole source is not built for every edit
+    """
+    def __init__(self, source):
+        self.source = source
+        self.last = (0, 1)  # (offset, column) of the last column query
+        self.lastLine = (0, 1)  # (line start, line) of the last line query
+
+    def line(self, offset):
+        """
+        returns the line number (from 1) of a byte offset, the line breaks
+        are counted from the line of the last offset asked when it comes before
+        """
+        begin, line = self.lastLine
+        if begin > offset:
+            begin, line = 0, 1
+        for match in LINE_BREAK.finditer(self.source, begin, offset + 1):
+            if match.end() <= offset:
+                begin = match.end()
+                line += 1
+        self.lastLine = (begin, line)
+        return line
+
+    def column(self, offset):
+        """
+        returns the column (from 1, in characters) of a byte offset, counted
+        from the last offset asked when it is on the same line, as LineIndex
+        """
+        source = self.source
+        begin, column = self.last
+        if begin > offset or LINE_BREAK.search(source, begin, offset) or \
+                (begin < len(source) and source[begin] & 0xC0 == 0x80):
+            begin = source.rfind(b"\n", 0, offset) + 1
+            begin = source.rfind(b"\r", begin, offset) + 1 or begin
+            column = 1
+        column += len(source[begin:offset].decode("utf-8", "replace"))
+        self.last = (offset, column)
+        return column
+
+    def position(self, offset):
+        """
+        returns the (line, column) pair of a byte offset
+        """
+        return self.line(offset), self.column(offset)
+
+
+class IncrementalParser:
+    """
+    Keeps the parse results of an edited source buffer up to date, piece by
+    piece: starts holds the index of the first token of every piece, the
+    header first, and results the PieceResult of every piece
+    """
+    def __init__(self, source, engine="table", scanEngine="dfa"):
+        self.engine = engine
+        self.scanner = IncrementalScanner(source, scanEngine)
+        self.columns = SourceColumns(self.scanner.source)  # made again after every edit
+        self.parser = Parser()
+        self.starts = self.cut(0, self.tokenCount())
+        self.results = [self.parsePiece(k) for k in range(len(self.starts))]
+        self.rejected = sum(not result.accepted for result in self.results)
+
+    def tokenCount(self):
+        """
+        returns the number of tokens before the EOF token
+        """
+        return len(self.scanner.tokenList) - 1
+
+    def cut(self, start, end):
+        """
+        returns the piece starts of tokens start to end, start begins a piece
+        """
+        tokenList = self.scanner.tokenList
+        return [start] + [i for i in range(start + 1, end) if tokenList[i].code in MODIFIERS]
+
+    def pieceEnd(self, k):
+        """
+        returns the index after the last token of the k-th piece
+        """
+        return self.starts[k + 1] if k + 1 < len(self.starts) else self.tokenCount()
+
+    def parsePiece(self, k):
+        """
+        parse the tokens of the k-th piece followed by an EOF token, the next
+        token stands for the end of the piece
+        """
+        token = self.scanner.token
+        columns = self.columns
+        start, end = self.starts[k], self.pieceEnd(k)
+
+        # the parser reads copies of the tokens of the scanner, which find
+        # their column in the edited source: it changes again after the parse
+        tokens = []
+        for i in range(start, end):
+            item = token(i)
+            copy = Token(item.lexeme, item.type, item.lineNum, item.start, item.end, columns, item.code)
+            copy.lexicalError = item.lexicalError
+            tokens.append(copy)
+        following = token(end)
+        tokens.append(Token("", "EOF", following.lineNum, following.start, following.start, columns, Terminal.END))
+
+        parser = self.parser
+        accepted = parser.parsing(None, trace=TraceLevel.OFF, engine=self.engine, tokens=tokens)
+        return PieceResult(accepted, parser.diagnostics, list(parser.symtab.symtab.items()), tokens[0].lineNum)
+
+    def edit(self, offset, deleted, inserted):
+        """
+        replace deleted bytes at offset by the inserted text, scan and parse
+        again the pieces it touched. returns the range of pieces parsed again
+        """
+        if isinstance(inserted, str):
+            inserted = inserted.encode("utf-8")
+        oldCount = self.tokenCount()
+        first, oldEnd, newEnd = self.scanner.edit(offset, deleted, inserted)
+        self.columns = SourceColumns(self.scanner.source)
+        grown = newEnd - oldEnd
+        starts = self.starts
+
+        # pieces from the one holding the token before the edit to the one
+        # holding the first token after it, unless that token starts a piece
+        low = bisect_right(starts, first - 1) - 1 if first > 0 else 0
+        if oldEnd >= oldCount:
+            high = len(starts)
+        else:
+            high = bisect_right(starts, oldEnd) - 1
+            if starts[high] < oldEnd:
+                high += 1
+        high = max(high, low + 1)
+
+        # the pieces after them only moved, but the columns of a piece starting
+        # on the line the edit ends on changed: parse it as well
+        tokenCount = self.tokenCount()
+        end = starts[high] + grown if high < len(starts) else tokenCount
+        editEnd = offset + len(inserted)
+        while high < len(starts) and not LINE_BREAK.search(self.scanner.source, editEnd, self.scanner.token(end).start):
+            high += 1
+            end = starts[high] + grown if high < len(starts) else tokenCount
+
+        pieces = self.cut(starts[low], end)
+        if grown:
+            for k in range(high, len(starts)):
+                starts[k] += grown
+        starts[low:high] = pieces
+        old = self.results[low:high]
+        self.results[low:high] = [None] * len(pieces)
+        for k in range(low, low + len(pieces)):
+            self.results[k] = self.parsePiece(k)
+        self.rejected += sum(not result.accepted for result in self.results[low:low + len(pieces)]) - \
+            sum(not result.accepted for result in old)
+        return low, low + len(pieces)
+
+    @property
+    def accepted(self):
+        """
+        True when the whole source is accepted
+        """
+        return self.rejected == 0
+
+    def diagnostics(self):
+        """
+        returns the diagnostics of the pieces in source order, moved to the
+        current lines of their piece
+        """
+        diagnostics = []
+        for k, result in enumerate(self.results):
+            if not result.diagnostics:
+                continue
+            delta = self.scanner.token(self.starts[k]).lineNum - result.baseLine
+            for diagnostic in result.diagnostics:
+                if delta and diagnostic.line is not None:
+                    diagnostic = diagnostic._replace(line=diagnostic.line + delta)
+                diagnostics.append(diagnostic)
+        return diagnostics
+
+    def symbols(self):
+        """
+        returns the symbol table of the source, merged from the pieces
+        """
+        symtab = OrderedDict()
+        for result in self.results:
+            for lexeme, tokenType in result.symbols:
+                symtab[lexeme] = tokenType
+        return symtab
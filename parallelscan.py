@@ -0,0 +1,75 @@
+"""
+Parallel scanning of very large source files
+
+The file is split into chunks that end right after a newline. A newline
+always separates tokens and ends a # comment, so every chunk can be scanned
+on its own, and the token streams of the chunks, which hold file offsets,
+concatenate to exactly the stream of the sequential scanner.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from scanner import Scanner, openSource
+from tokens import TokenBuffer
+
+# files smaller than this are not worth sending to a process pool
+MIN_CHUNK_SIZE = 1 << 20
+
+
+def chunkBoundaries(source, chunks):
+    """
+    returns the (start, end) offsets of about `chunks` chunks of the source,
+    each one ending right after a newline or at the end of the source
+    """
+    size = len(source)
+    boundaries = []
+    start = 0
+    for i in range(1, chunks + 1):
+        end = size * i // chunks
+        if end < size:
+            newline = source.find(b"\n", max(end - 1, start))
+            end = size if newline < 0 else newline + 1
+        if end > start:
+            boundaries.append((start, end))
+            start = end
+        if start >= size:
+            break
+    return boundaries
+
+
+def scanChunk(sourceFile, engine, start, end):
+    """
+    process pool worker: scan one chunk of the file, returns the columns of its
+    token buffer
+    """
+    scanner = Scanner(sourceFile, engine)
+    scanner.seek(start, end)
+    columns = scanner.scanBuffer().columns()
+    scanner.close()
+    return columns
+
+
+def scanParallel(sourceFile, jobs=None, engine="dfa"):
+    """
+    scan a source file with a pool of `jobs` processes (one per CPU by default),
+    returns a TokenBuffer equal to the one of the sequential scanner.
+    workers map the file themselves, in-memory buffers are scanned sequentially
+    """
+    jobs = jobs or os.cpu_count() or 1
+    source = openSource(sourceFile)
+    chunks = min(jobs, len(source) // MIN_CHUNK_SIZE)
+
+    if chunks <= 1 or not isinstance(sourceFile, str):
+        scanner = Scanner(source, engine)
+        return scanner.scanBuffer()
+
+    boundaries = chunkBoundaries(source, chunks)
+
+    tokens = TokenBuffer(source)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        parts = executor.map(scanChunk, [sourceFile] * len(boundaries), [engine] * len(boundaries),
+                             [start for start, end in boundaries], [end for start, end in boundaries])
+        for columns in parts:
+            for column, part in zip(tokens.columns(), columns):
+                column.extend(part)
+    return tokens
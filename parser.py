@@ -1,30 +1,59 @@
+from array import array
+from collections import namedtuple
 from scanner import Scanner
+from terminals import TOKEN_LOOKUP, Terminal
+import parsetrace
+from parsetrace import TraceLevel, TRACE_PATH, HEADER, openTrace
+import tablegen
+from tablegen import TABLE_COLUMNS
+import descentgen
 from bookkeeper import Bookkeeper
+from syntaxtree import SyntaxTree, NONE
 
 class Stack:
     """
-    stack implementation using list
+    stack implementation using the end of a byte array, every grammar symbol
+    code fits in a signed byte and push/pop are O(1)
     """
     def __init__(self):
-        self.items = []
+        self.items = array('b')
 
     def isEmpty(self):
-        return self.items == []
+        return not self.items
 
     def push(self, item):
-        self.items.insert(0, item)
+        self.items.append(item)
 
     def pop(self):
-        return self.items.pop(0)
+        return self.items.pop()
 
     def peek(self):
-        return self.items[0]
+        return self.items[-1]
+
+    def extend(self, items):
+        """
+        push several items at once, the last one ends on top
+        """
+        self.items.extend(items)
 
     def size(self):
         return len(self.items)
 
+    def clear(self):
+        """
+        empty the stack, popping keeps the storage of the array for the next
+        parse while truncating it would free it
+        """
+        pop = self.items.pop
+        while self.items:
+            pop()
+
     def print_stack(self):
-        print (self.items)
+        print (self.items[::-1].tolist())  # stack top first
+
+
+# a syntax error or invalid token reported by the parser
+Diagnostic = namedtuple("Diagnostic", "line column lexeme message")
 
 
 class Parser(object):
@@ -32,250 +61,79 @@ class Parser(object):
     LL(1) parser implementation
     """
     # integer coding of tokens, corresponding to index of token
-    token_lookup = ["Z0","[id]","[const]","package", "import","abstract","final","sealed","private",
-                            "protected","class","object","val","def","<=","if","else","while","case","=>","in",
-                            "print","return","not","true","false","and","or","int","real","bool",
-                            ";","{","}","(", ")",":",",","=","+","*","@",
-                            "<scala>","<packages>","<imports>","<scala-body>","<subbody>","<modifier>",
-                            "<subbody-tail>","<tail-type>","<block>","<stmts>","<stmt>","<dcl>","<dcl-tail>",
-                            "<ids>","<more-ids>","<type>","<asmt>","<if>","<while>","<case>","<in>","<out>",
-                            "<return>","<expr>","<arith-expr>","<arith>","<bool-expr>","<bool>","$"]
-
-    # syntax rules representation for simple-scala language using dictionary
-    #key: rule number, value: integer coded of productions
-    syntax_rules = {1:[43,44,45],
-                            2:[3,1,31,43],
-                            3:[-1],
-                            4:[4,1,31,44],
-                            5:[-1],
-                            6:[46,45],
-                            7:[-1],
-                            8:[47,48],
-                            9:[5],
-                            10:[6],
-                            11:[7],
-                            12:[8],
-                            13:[9],
-                            14:[49,50],
-                            15:[10],
-                            16:[11],
-                            17:[32,51,33],
-                            18:[52,31,51],
-                            19:[-1],
-                            20:[53],
-                            21:[58],
-                            22:[59],
-                            23:[60],
-                            24:[61],
-                            25:[62],
-                            26:[63],
-                            27:[64],
-                            28:[50],
-                            29:[12,54],
-                            30:[13,1,34,55,35,50],
-                            31:[55,36,57],
-                            32:[1,56],
-                            33:[37,1,56],
-                            34:[-1],
-                            35:[28],
-                            36:[29],
-                            37:[30],
-                            38:[1,14,65],
-                            39:[15,34,65,35,52,31,16,52],
-                            40:[17,34,65,35,52],
-                            41:[18,1,38,65,19,52],
-                            42:[20,34,55,35],
-                            43:[21,34,55,35],
-                            44:[22,34,65,35],
-                            45:[66],
-                            46:[68],
-                            47:[1,67],
-                            48:[2,67],
-                            49:[34,66,35,67],
-                            50:[39,66],
-                            51:[40,66],
-                            52:[-1],
-                            53:[23,34,68,35,69],
-                            54:[24,69],
-                            55:[25,69],
-                            56:[41,66,66],
-                            57:[26,68],
-                            58:[27,68],
-                            59:[-1],
-                            }
-
-    # parse table for the grammer rules
+    token_lookup = TOKEN_LOOKUP
+
+    # syntax rules representation for simple-scala language using dictionary,
+    # grouped by the non-terminal they expand
+    #key: non-terminal (left hand side), value: {rule number: integer coded production}
+    grammar_rules = {42:{1:[43,44,45]},  # <scala>
+                     43:{2:[3,1,31,43], 3:[-1]},  # <packages>
+                     44:{4:[4,1,31,44], 5:[-1]},  # <imports>
+                     45:{6:[46,45], 7:[-1]},  # <scala-body>
+                     46:{8:[47,48]},  # <subbody>
+                     47:{9:[5], 10:[6], 11:[7], 12:[8], 13:[9]},  # <modifier>
+                     48:{14:[49,50]},  # <subbody-tail>
+                     49:{15:[10], 16:[11]},  # <tail-type>
+                     50:{17:[32,51,33]},  # <block>
+                     51:{18:[52,31,51], 19:[-1]},  # <stmts>
+                     52:{20:[53], 21:[58], 22:[59], 23:[60], 24:[61], 25:[62], 26:[63], 27:[64], 28:[50]},  # <stmt>
+                     53:{29:[12,54], 30:[13,1,34,55,35,50]},  # <dcl>
+                     54:{31:[55,36,57]},  # <dcl-tail>
+                     55:{32:[1,56]},  # <ids>
+                     56:{33:[37,1,56], 34:[-1]},  # <more-ids>
+                     57:{35:[28], 36:[29], 37:[30]},  # <type>
+                     58:{38:[1,14,65]},  # <asmt>
+                     59:{39:[15,34,65,35,52,31,16,52]},  # <if>
+                     60:{40:[17,34,65,35,52]},  # <while>
+                     61:{41:[18,1,38,65,19,52]},  # <case>
+                     62:{42:[20,34,55,35]},  # <in>
+                     63:{43:[21,34,55,35]},  # <out>
+                     64:{44:[22,34,65,35]},  # <return>
+                     65:{45:[66], 46:[68]},  # <expr>
+                     66:{47:[1,67], 48:[2,67], 49:[34,66,35,67]},  # <arith-expr>
+                     67:{50:[39,66], 51:[40,66], 52:[-1]},  # <arith>
+                     68:{53:[23,34,68,35,69], 54:[24,69], 55:[25,69], 56:[41,66,66]},  # <bool-expr>
+                     69:{57:[26,68], 58:[27,68], 59:[-1]},  # <bool>
+                     }
+
+    # rule number -> production, and rule number -> head non-terminal
+    syntax_rules, rule_heads = tablegen.splitRules(grammar_rules)
+
+    # parse table for the grammer rules, generated from the rules with their
+    # FIRST and FOLLOW sets and cached until the grammar changes
     # 2 layer dictionary format
     # outter keys are non-terminal symbols (stack top),
     # inner keys are terminal symbols (lookaheads)
     # inner values are corresponding rules for  given stack top and lookahead
-    parse_table ={
-        42: {
-            3:1,
-            4:1,
-            5:1,
-            6:1,
-            7:1,
-            8:1,
-            9:1
-        },
-        43: {
-            3:2,
-            4:3,
-            5:3,
-            6:3,
-            7:3,
-            8:3,
-            9:3
-        },
-        44: {
-            4:4,
-            5:5,
-            6:5,
-            7:5,
-            8:5,
-            9:5
-        },
-        45: {
-            5:6,
-            6:6,
-            7:6,
-            8:6,
-            9:6,
-            70:7
-        },
-        46: {
-            5:8,
-            6:8,
-            7:8,
-            8:8,
-            9:8
-        },
-        47: {
-            5:9,
-            6:10,
-            7:11,
-            8:12,
-            9:13
-        },
-        48: {
-            10:14,
-            11:14
-        },
-        49: {
-            10:15,
-            11:16
-        },
-        50: {
-            32:17
-        },
-        51: {
-            12:18,
-            13:18,
-            1:18,
-            15:18,
-            17:18,
-            18:18,
-            20:18,
-            21:18,
-            22:18,
-            32:18,
-            33:19
-        },
-        52: {
-            12:20,
-            13:20,
-            1:21,
-            15:22,
-            17:23,
-            18:24,
-            20:25,
-            21:26,
-            22:27,
-            32:28
-        },
-        53: {
-            12:29,
-            13:30
-        },
-        54: {
-            1:31
-        },
-        55: {
-            1:32
-        },
-        56: {
-            37:33,
-            36:34,
-            35:34
-        },
-        57: {
-            28:35,
-            29:36,
-            30:37
-        },
-        58: {
-            1:38
-        },
-        59: {
-            15:39
-        },
-        60:{
-            17:40
-        },
-        61:{
-            18:41
-        },
-        62:{
-            20:42
-        },
-        63:{
-            21:43
-        },
-        64:{
-            22:44
-        },
-        65:{
-            1:45,
-            2:45,
-            34:45,
-            23:46,
-            24:46,
-            25:46,
-            41:46
-        },
-        66:{
-            1:47,
-            2:48,
-            34:49
-        },
-        67:{
-            39:50,
-            40:51,
-            31:52,
-            35:52,
-            19:52,
-            1:52,
-            2:52
-        },
-        68:{
-            23:53,
-            24:54,
-            25:55,
-            41:56,
-        },
-        69:{
-            26:57,
-            27:58,
-            31:59,
-            35:59,
-            19:59
-        }
-    }
+    # the parsing loop uses the same table as a flat list and the rule bodies
+    # reversed and without epsilon
+    parse_table, dense_table, rule_bodies, follow_sets = tablegen.loadTables(rule_heads, syntax_rules)
+
+    # synchronizing tokens of the error recovery: a non-terminal without a rule
+    # for the lookahead is popped at a token of its FOLLOW set
+    sync_sets = dict((symbol, follow | {Terminal.END}) for symbol, follow in follow_sets.items())
+
+    # recursive-descent parsers generated from the same table, the "descent"
+    # engine of parsing
+    descent_parsers = descentgen.loadParser(rule_heads, syntax_rules, parse_table)
+    engines = ("table", "descent")
 
     def __init__(self):
         self.stack = Stack()
         self.symtab = Bookkeeper()
+        self.scanner = None  # created by the first parse, reset for the next ones
+        self.tree = None  # syntax tree of the last parse, when asked for
+        self.diagnostics = []  # errors reported by the last parse
+
+    def reset(self):
+        """
+        get ready for another parse: the stack, the symbol table and the
+        scanner are emptied and reused instead of being created again
+        """
+        self.stack.clear()
+        self.symtab.clear()
+        self.tree = None
+        self.diagnostics = []  # a new list, the last one may still be in use
 
     def executeRule(self,ruleNum):
         """
@@ -284,118 +142,249 @@ class Parser(object):
         #remove stack top token
         self.stack.pop()
 
-        try:
-            ruleItems = Parser.syntax_rules[ruleNum]
-        except:
+        # push the rule items, stored reversed and without epsilon moves
+        if 0 < ruleNum < len(Parser.rule_bodies):
+            self.stack.extend(Parser.rule_bodies[ruleNum])
+        else:
             print ("Grammar does not have rule number: ", ruleNum)
 
-        # push the rule items to stack in reversed order
-        for item in reversed(ruleItems):
-            # -1 represent epsilon move, which will be skip
-            if item != -1:
-                self.stack.push(item)
-
     def findRule(self, stackTop, lookahead):
         """
         given stack top and lookahead symbol, find the next deterministic move
         using LL(1) parse table
         """
-        try:
-            rule = Parser.parse_table[stackTop][lookahead]
-        except:
+        rule = Parser.dense_table[stackTop * TABLE_COLUMNS + lookahead + 1]
+        if rule == -1:
             print ("Parse Table lookup failed, stack top: %d, lookahead %d"%(stackTop, lookahead))
-            return -1
         return rule
 
-    def get_token(self, token):
+    def tokenCode(self, token):
         """
-        find the integer representation of the token
+        integer representation of a token, given by the scanner, the end of
+        input token is $. invalid tokens are not terminals and give -1
         """
-        try:
-            tokenValue = Parser.token_lookup.index(token)
-        except:
-            print ("Token is not a reserved keyword, identifier, or constant? ", token)
-            return -1
+        if token.code == Terminal.UNKNOWN:
+            self.report(token, "Token is not a reserved keyword, identifier, or constant?  %s" % token.lexeme, None)
+        return token.code
 
-        return tokenValue
+    def report(self, token, message, detail=""):
+        """
+        print a diagnostic at a token and add it to the diagnostics of the parse.
+        the line of the token is printed between message and detail, unless
+        detail is None, but not stored in the message: it is the line field
+        """
+        if detail is None:
+            print (message)
+            detail = ""
+        else:
+            print ("%s at line %s%s" % (message, token.lineNum, detail))
+        self.diagnostics.append(Diagnostic(token.lineNum, token.column, token.lexeme, (message + detail).strip()))
+
+    def syntaxError(self, token, output):
+        """
+        report a syntax error at a token, with the last parse steps of a ring trace
+        """
+        self.report(token, "Syntax error caught by parser", ", token: %s\n" % token.lexeme)
+        context = output.context() if output else []
+        if context:
+            print ("Last %d parse steps:\n%s" % (len(context), HEADER + "".join(context)))
 
-    def parsing(self, sourceFile):
+    def parsing(self, sourceFile, cache=True, trace=TraceLevel.FULL, tracePath=TRACE_PATH,
+                traceFormat="text", ringSize=1000, buildTree=False, engine="table", text=False, tokens=None):
         """
-        start paring the source file
+        start paring the source file, its tokens are reused from the
+        token cache when the file has not changed since it was last scanned.
+        cache is True (cache next to the file), False or a cache directory.
+        the steps are written to tracePath (text or binary traceFormat) or kept
+        in a ring of the last ringSize steps (ring traceFormat) that is printed
+        on a syntax error, trace is the level of steps reported.
+        with buildTree the parse tree is kept in self.tree, its terminal nodes
+        refer to the tokens of a TokenBuffer of the source file.
+        engine is the table-driven loop (table) or the generated
+        recursive-descent parser (descent). syntax errors are recovered from,
+        they are kept in self.diagnostics. returns True when the source is
+        accepted without errors.
+        sourceFile is a file path or a bytes buffer, or with text a string of
+        source code. the parser is reset first, so it can parse one source
+        after another. with tokens, a sequence of Tokens ending with the EOF
+        token, the tokens are parsed instead of scanning sourceFile
         """
+        if engine not in Parser.engines:
+            raise ValueError("Unknown parser engine: %s" % engine)
+        self.reset()
+        if engine == "descent":
+            try:
+                if self.descend(sourceFile, cache, trace, tracePath, traceFormat, ringSize, buildTree, text, tokens):
+                    return True
+            except RecursionError:
+                pass  # nesting deeper than the Python recursion limit
+            # the table loop recovers from syntax errors and reports them, and
+            # has no depth limit: parse again with it
+            self.reset()
+
         step = 1
-        scanner = Scanner(sourceFile)  # pass source file to the scanner
-        output = open("parse_output.txt", "w")  # open the output file
-        output.write("{:<6}{:>14}  {:<6}{:>14}  {:<6}{:>14}\n".format("Steps", "Stack Top","Num","Lookahead","Num","Action"))
-        output.write("-"*70+"\n")
+        nextToken, tree, nodes = self.tokenSource(sourceFile, cache, buildTree, text, tokens)
+        tokenIndex = 0  # index of the lookahead token in the token stream
+        trace = TraceLevel(trace)
+        output = openTrace(traceFormat, tracePath, ringSize) if trace else None
+        traceRules = trace >= TraceLevel.RULES  # rules, error recovery, start and accept
+        traceMatches = trace >= TraceLevel.FULL
+        accepted = False
 
         self.stack.push(0) # push stack bottom marker
         stackTop = self.stack.peek()
-        output.write ("{:<6}{:>14}  {:<6}{:>14}  {:<6}{:>14}\n".format(step, Parser.token_lookup[stackTop], stackTop,
-           "-", "-", "push <scala>"))
+        if traceRules:
+            output.step(step, stackTop, -1, parsetrace.START)
         step += 1
 
         self.stack.push(42) # push <scala>
 
-        # scanner first token, token object contains lexeme and type
-        token = scanner.nextToken()
-        token_lex = token.lexeme
+        # scanner first token, token object contains lexeme, type and terminal code
+        token = nextToken()
 
         # get the token value
-        lookahead = self.get_token(token_lex)
+        lookahead = self.tokenCode(token)
 
-        # loop until all source code scanned or an error occured
-        while True:
-            stackTop = self.stack.peek()
+        # loop until all source code scanned, after a syntax error the parser
+        # recovers in panic mode: symbols are popped from the stack or tokens
+        # skipped until the parse can go on. every error step pops the stack or
+        # consumes a token, so the loop always ends
+        recovering = False  # no new syntax error is reported until a token matches
+        try:
+            while True:
+                stackTop = self.stack.peek()
+
+                # if stack top is bottom marker and lookahead is the end of input: accept!
+                if stackTop == 0 and lookahead == Terminal.END:
+                    accepted = not self.diagnostics
+                    if traceRules and accepted:
+                        output.step(step, stackTop, -1, parsetrace.ACCEPT)
+                    break
 
-            # if stack top is bottom marker and end of source file: accept!
-            if stackTop == 0 and not scanner.nextToken():
-                output.write ("{:<6}{:>14}  {:<6}{:>14}  {:<6}{:>14}\n".format(step, Parser.token_lookup[stackTop], stackTop,
-                       "-","-", "ACCEPT!"))
-                output.close()
-                break
-
-            # if stack top is one of terminal symbols and matches lookahead symbol
-            # pop the stack top and read next token
-            if (stackTop in range(1,42) and stackTop == lookahead):
-                output.write ("{:<6}{:>14}  {:<6}{:>14}  {:<6}{:>14}\n".format(step, Parser.token_lookup[stackTop], stackTop,
-                   Parser.token_lookup[lookahead], lookahead, "match"))
-
-                # symbol matched, pop stack and get next token
-                self.stack.pop()
-                token = scanner.nextToken()
-
-                # assign lexeme of [id] if token is of type identifier
-                if token.type == "ID":
-                    self.symtab.insert(token)
-                    token_lex = "[id]"
-
-                # assign lexeme of [const] if token is of type constant
-                elif token.type == "CONST":
-                    self.symtab.insert(token)
-                    token_lex = "[const]"
+                # if stack top is one of terminal symbols and matches lookahead symbol
+                # pop the stack top and read next token
+                if (0 < stackTop < 42 and stackTop == lookahead):
+                    if traceMatches:
+                        output.step(step, stackTop, lookahead, parsetrace.MATCH)
+
+                    # symbol matched, pop stack and get next token
+                    self.stack.pop()
+                    if tree is not None:
+                        tree.tokenIndex[nodes.pop()] = tokenIndex
+                    token = nextToken()
+                    tokenIndex += 1
+                    recovering = False
+
+                    # get token value, identifiers and constants are [id] and [const]
+                    lookahead = self.tokenCode(token)
+                    if lookahead == Terminal.ID or lookahead == Terminal.CONST:
+                        self.symtab.insert(token)
+                    step += 1
+                    continue
+
+                # stack top is a terminal symbol but lookahead does not match: the
+                # terminal is taken as missing and popped, an invalid token is skipped
+                elif 0 < stackTop < 42:
+                    if not recovering:
+                        self.report(token, "Expecting token %s" % Parser.token_lookup[stackTop],
+                                    ", but found %s\n" % token.lexeme)
+                    recovering = True
+                    skip = lookahead == Terminal.UNKNOWN
+
+                # input left after the program: skip to the next subbody
+                elif stackTop == 0:
+                    if not recovering:
+                        self.findRule(stackTop, lookahead)
+                        self.syntaxError(token, output)
+                    recovering = True
+                    ruleNum = Parser.dense_table[45 * TABLE_COLUMNS + lookahead + 1]
+                    skip = ruleNum == -1 or not Parser.rule_bodies[ruleNum]
+                    if not skip:
+                        self.stack.push(45)  # push <scala-body>
+                        if tree is not None:
+                            nodes.append(tree.addNode(45))  # not linked to the root
+                        step += 1
+                        continue
+
+                # stack top is a non-terminal symbol
                 else:
-                    token_lex = token.lexeme
-
-                # get token value
-                lookahead = self.get_token(token_lex)
-
-            # stack top is a terminal symbol but lookahead does not match, handle error
-            elif stackTop in range(1,42):
-                print ("Expecting token %s at line %s, but found %s\n" %(Parser.token_lookup[stackTop],
-                    token.lineNum, token.lexeme))
+                    # find rule for with stack top symbol and lookahead
+                    ruleNum = Parser.dense_table[stackTop * TABLE_COLUMNS + lookahead + 1]
+                    if ruleNum != -1:
+                        self.executeRule(ruleNum)
+                        if tree is not None:
+                            tree.expand(nodes.pop(), Parser.rule_bodies[ruleNum], nodes)
+                        if traceRules:
+                            output.step(step, stackTop, lookahead, ruleNum)
+                        step += 1
+                        continue
+
+                    # parse table can't find possible next move: pop the non-terminal
+                    # at a synchronizing token, skip the token otherwise
+                    if not recovering:
+                        self.findRule(stackTop, lookahead)  # reports the failed lookup
+                        self.syntaxError(token, output)
+                    recovering = True
+                    skip = lookahead not in Parser.sync_sets[stackTop]
+
+                if skip:
+                    if traceRules:
+                        output.step(step, stackTop, lookahead, parsetrace.SKIP)
+                    token = nextToken()
+                    tokenIndex += 1
+                    lookahead = self.tokenCode(token)
+                    if lookahead == Terminal.ID or lookahead == Terminal.CONST:
+                        self.symtab.insert(token)
+                else:
+                    if traceRules:
+                        output.step(step, stackTop, lookahead, parsetrace.POP)
+                    self.stack.pop()
+                    if tree is not None:
+                        nodes.pop()
+
+                # increment step counter for output
+                step += 1
+        finally:
+            if output:
+                output.close()
+            self.tree = tree
+        return accepted
 
-            # stack top is a non-terminal symbol
+    def tokenSource(self, sourceFile, cache, buildTree, text=False, tokens=None):
+        """
+        returns the function giving the next token of the source file (or of
+        the tokens), and with buildTree the syntax tree and its node stack
+        """
+        if tokens is None:
+            if self.scanner is None:
+                self.scanner = Scanner(sourceFile, cache=cache, text=text)  # pass source file to the scanner
             else:
-                # find rule for with stack top symbol and lookahead
-                ruleNum = self.findRule(stackTop, lookahead)
-                if ruleNum == -1: # parse table can't find possible next move
-                    print ("Syntax error caught by parser at line %s, token: %s\n" %(token.lineNum, token.lexeme))
-                    break
-
-                self.executeRule(ruleNum)
-                output.write ('{:<6}{:>14}  {:<6}{:>14}  {:<6}{:>14}\n'.format(step, Parser.token_lookup[stackTop], stackTop,
-                   Parser.token_lookup[lookahead], lookahead, "Rule "+ str(ruleNum)))
-
-            # increment step counter for output
-            step += 1
+                self.scanner.cache = cache
+                self.scanner.reset(sourceFile, text)
+            if not buildTree:
+                return self.scanner.nextToken, None, None
+            tokens = self.scanner.scanBuffer()
+        elif not buildTree:
+            return iter(tokens).__next__, None, None
+        tree = SyntaxTree(tokens)
+        nodes = [NONE, tree.addNode(42)]  # tree node of every stack item
+        return iter(tree.tokens).__next__, tree, nodes
+
+    def descend(self, sourceFile, cache, trace, tracePath, traceFormat, ringSize, buildTree, text=False, tokens=None):
+        """
+        parse the source file with the generated recursive-descent parser,
+        returns True when it is accepted
+        """
+        nextToken, tree, nodes = self.tokenSource(sourceFile, cache, buildTree, text, tokens)
+        trace = TraceLevel(trace)
+        output = openTrace(traceFormat, tracePath, ringSize) if trace else None
+        try:
+            if trace or tree is not None:
+                generated = Parser.descent_parsers.GeneratedParser
+            else:
+                generated = Parser.descent_parsers.FastParser
+            return generated(self, nextToken, output, trace, tree, nodes).parse()
+        finally:
+            if output:
+                output.close()
+            self.tree = tree
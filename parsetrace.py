@@ -0,0 +1,169 @@
+"""
+Parse trace output
+
+The parser reports every step to a trace: the step number, the stack top,
+the lookahead and the action taken. Traces write the steps as text (the
+parse_output.txt format), as compact binary records, or keep only the last
+steps in memory to give context to syntax errors. The trace level selects
+which steps are reported.
+
+usage: python parsetrace.py trace.bin [output.txt]  (pretty-print a binary trace)
+"""
+from collections import deque
+from enum import IntEnum
+import struct
+import sys
+
+from terminals import TOKEN_LOOKUP
+
+TRACE_PATH = "parse_output.txt"
+
+# actions of a step, a positive action is the number of the rule expanded
+MATCH = 0
+ACCEPT = -1
+START = -2  # push of the start symbol
+POP = -3  # syntax error recovery, the stack top is popped
+SKIP = -4  # syntax error recovery, the lookahead token is skipped
+
+LINE = "{:<6}{:>14}  {:<6}{:>14}  {:<6}{:>14}\n"
+HEADER = LINE.format("Steps", "Stack Top", "Num", "Lookahead", "Num", "Action") + "-" * 70 + "\n"
+
+MAGIC = b"PTRC"
+RECORD = struct.Struct("<ibbh")  # step, stack top, lookahead, action
+
+
+class TraceLevel(IntEnum):
+    """
+    steps reported to the trace
+    """
+    OFF = 0  # no trace at all
+    RULES = 1  # rule expansions, error recovery, start and accept
+    FULL = 2  # every step, matches included
+
+
+def formatStep(step, stackTop, lookahead, action):
+    """
+    returns the text line of a step
+    """
+    if action == START:
+        return LINE.format(step, TOKEN_LOOKUP[stackTop], stackTop, "-", "-", "push <scala>")
+    if action == ACCEPT:
+        return LINE.format(step, TOKEN_LOOKUP[stackTop], stackTop, "-", "-", "ACCEPT!")
+    if action == POP or action == SKIP:
+        # the lookahead may be an invalid token (-1)
+        return LINE.format(step, TOKEN_LOOKUP[stackTop], stackTop, TOKEN_LOOKUP[lookahead] if lookahead >= 0 else "?",
+                           lookahead, "error pop" if action == POP else "error skip")
+    return LINE.format(step, TOKEN_LOOKUP[stackTop], stackTop, TOKEN_LOOKUP[lookahead], lookahead,
+                       "match" if action == MATCH else "Rule " + str(action))
+
+
+class TextTrace:
+    """
+    writes the steps as text lines
+    """
+    def __init__(self, path=TRACE_PATH):
+        self.output = open(path, "w", buffering=1 << 16)
+        self.output.write(HEADER)
+
+    def step(self, step, stackTop, lookahead, action):
+        self.output.write(formatStep(step, stackTop, lookahead, action))
+
+    def context(self):
+        return []
+
+    def close(self):
+        self.output.close()
+
+
+class BinaryTrace:
+    """
+    writes the steps as fixed-size binary records, formatted later by printTrace
+    """
+    FLUSH_SIZE = 1 << 20
+
+    def __init__(self, path):
+        self.output = open(path, "wb")
+        self.output.write(MAGIC)
+        self.buffer = bytearray()
+
+    def step(self, step, stackTop, lookahead, action):
+        self.buffer += RECORD.pack(step, stackTop, lookahead, action)
+        if len(self.buffer) >= BinaryTrace.FLUSH_SIZE:
+            self.output.write(self.buffer)
+            self.buffer = bytearray()
+
+    def context(self):
+        return []
+
+    def close(self):
+        self.output.write(self.buffer)
+        self.output.close()
+
+
+class RingTrace:
+    """
+    keeps the last steps in memory, they are formatted only when asked for
+    """
+    def __init__(self, size=1000):
+        self.steps = deque(maxlen=size)
+
+    def step(self, step, stackTop, lookahead, action):
+        self.steps.append((step, stackTop, lookahead, action))
+
+    def context(self):
+        """
+        returns the text lines of the last steps
+        """
+        return [formatStep(*step) for step in self.steps]
+
+    def close(self):
+        pass
+
+
+def openTrace(traceFormat="text", path=TRACE_PATH, ringSize=1000):
+    """
+    returns a trace of the given format: text, binary or ring
+    """
+    if traceFormat == "text":
+        return TextTrace(path)
+    elif traceFormat == "binary":
+        return BinaryTrace(path)
+    elif traceFormat == "ring":
+        return RingTrace(ringSize)
+    raise ValueError("Unknown trace format: %s" % traceFormat)
+
+
+def readTrace(path):
+    """
+    yield the (step, stack top, lookahead, action) records of a binary trace
+    """
+    with open(path, "rb") as trace:
+        data = trace.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a binary parse trace: %s" % path)
+    size = len(data) - (len(data) - len(MAGIC)) % RECORD.size  # ignore a truncated last record
+    yield from RECORD.iter_unpack(memoryview(data)[len(MAGIC):size])
+
+
+def printTrace(path, output):
+    """
+    write a binary trace as text, in the parse_output.txt format
+    """
+    output.write(HEADER)
+    for record in readTrace(path):
+        output.write(formatStep(*record))
+
+
+def main():
+    if len(sys.argv) < 2:
+        print ("usage: python parsetrace.py trace.bin [output.txt]")
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as output:
+            printTrace(sys.argv[1], output)
+    else:
+        printTrace(sys.argv[1], sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
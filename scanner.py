@@ -1,987 +1,472 @@
-from token import Token
+from tokens import Token, TokenBuffer, LineIndex, LexicalError, TOKEN_TYPES, ERRORS, KEY, ID, CONST, SS, INVALID, EOF
+from terminals import KEYWORDS, SPECIAL_SYMBOLS, TERMINAL_CODES, Terminal
+import tokencache
+import mmap
 import re
-from enum import Enum
+from itertools import islice
 
-class LexicalError(Enum):
-    InvalidSyntax = 1 # any error not defined
-    InvalidIdentifier = 2  # identifier contains some unrecognized symbol
-    InvalidConstant = 3  # Starting with constant follow by a letter
-    UnrecognizedSymbol = 4  # symbol not recognized in our special symbols
-    MultipleDecimals = 5  # constant contains multiple decimal points
+# changing how tokens are scanned must bump this, it invalidates cached token streams
+SCANNER_VERSION = 4
+
+
+# character classes of the simple-scala language
+LETTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+DIGITS = "0123456789"
+WHITESPACE = " \t\r\n"
+
+# the scanner works on bytes, DFA columns are the byte values
+COLUMNS = 256
+
+# class codes of the bytes, CHAR_CLASSES[byte] replaces chained comparisons
+OTHER, LETTER, DIGIT, PERIOD, SPACE, NEWLINE, RETURN, COMMENT, CONTINUATION, LEAD = range(10)
+
+
+def buildCharClasses():
+    """
+    returns the 256-entry table giving the class code of every byte value
+    """
+    classes = bytearray([OTHER] * COLUMNS)
+    for char in LETTERS:
+        classes[ord(char)] = LETTER
+    for char in DIGITS:
+        classes[ord(char)] = DIGIT
+    classes[ord(".")] = PERIOD
+    classes[ord(" ")] = classes[ord("\t")] = SPACE
+    classes[ord("\n")] = NEWLINE
+    classes[ord("\r")] = RETURN
+    classes[ord("#")] = COMMENT
+    for byte in range(0x80, 0xC0):  # trailing bytes of a multi-byte utf-8 character
+        classes[byte] = CONTINUATION
+    for byte in range(0xC0, COLUMNS):  # leading bytes of a multi-byte utf-8 character
+        classes[byte] = LEAD
+    return bytes(classes)
+
+CHAR_CLASSES = buildCharClasses()
+
+STOP = -1  # no transition, the token ends before the current character
+START = 0
+
+
+def buildTransitions():
+    """
+    build the scanner DFA from the terminal symbols of the grammar
+    returns the transition table (state x column -> state) and, for every state,
+    the (token type code, terminal code, lexical error) of the token that ends in it
+    """
+    keywords = KEYWORDS
+    specialSymbols = SPECIAL_SYMBOLS
+    codes = TERMINAL_CODES
+
+    # white space, comments and special symbols end a token
+    separators = set(byte for byte in range(COLUMNS) if CHAR_CLASSES[byte] in (SPACE, NEWLINE, RETURN, COMMENT))
+    separators.update(ord(symbol) for symbol in specialSymbols)
+
+    transitions = []
+    accepts = []
+
+    def newState(tokenType, code, error=None):
+        transitions.append([STOP] * COLUMNS)
+        accepts.append((tokenType, code, error))
+        return len(transitions) - 1
+
+    def fill(state, charClasses, target):
+        row = transitions[state]
+        for byte in range(COLUMNS):
+            if CHAR_CLASSES[byte] in charClasses:
+                row[byte] = target
+
+    def fillNonSeparators(state, target):
+        # every character that does not end a token, used for error states
+        row = transitions[state]
+        for column in range(COLUMNS):
+            if column not in separators:
+                row[column] = target
+
+    unknown = int(Terminal.UNKNOWN)
+    start = newState(None, unknown)
+    identifier = newState(ID, int(Terminal.ID))
+    integer = newState(CONST, int(Terminal.CONST))
+    decimal = newState(CONST, int(Terminal.CONST))
+
+    # error states keep consuming until a token separator is found
+    errors = {}
+    for error in LexicalError:
+        errors[error] = newState(INVALID, unknown, error)
+        fillNonSeparators(errors[error], errors[error])
+
+    # identifiers: letter followed by letters, digits and periods
+    fillNonSeparators(identifier, errors[LexicalError.InvalidIdentifier])
+    fill(identifier, (LETTER, DIGIT, PERIOD), identifier)
+    fill(start, (LETTER,), identifier)
+
+    # constants: string of digits with no more than one decimal point
+    fillNonSeparators(integer, errors[LexicalError.InvalidConstant])
+    fill(integer, (DIGIT,), integer)
+    fill(integer, (PERIOD,), decimal)
+    fillNonSeparators(decimal, errors[LexicalError.InvalidConstant])
+    fill(decimal, (DIGIT,), decimal)
+    fill(decimal, (PERIOD,), errors[LexicalError.MultipleDecimals])
+    fill(start, (DIGIT,), integer)
+
+    # anything else starting a token is a single unrecognized symbol,
+    # which may be a character encoded on several bytes
+    unrecognized = newState(INVALID, unknown, LexicalError.UnrecognizedSymbol)
+    multibyte = newState(INVALID, unknown, LexicalError.UnrecognizedSymbol)
+    row = transitions[start]
+    for byte in range(COLUMNS):
+        if row[byte] == STOP and byte not in separators:
+            row[byte] = multibyte if CHAR_CLASSES[byte] in (CONTINUATION, LEAD) else unrecognized
+    fill(multibyte, (CONTINUATION,), multibyte)
+
+    # keywords spelled with letters form a trie branching off the identifier states
+    for keyword in [k for k in keywords if CHAR_CLASSES[ord(k[0])] == LETTER]:
+        state = start
+        for char in keyword:
+            target = transitions[state][ord(char)]
+            if target == identifier:
+                target = newState(ID, int(Terminal.ID))
+                fillNonSeparators(target, errors[LexicalError.InvalidIdentifier])
+                fill(target, (LETTER, DIGIT, PERIOD), identifier)
+                transitions[state][ord(char)] = target
+            state = target
+        # keyword followed by anything other than an identifier char or separator
+        accepts[state] = (KEY, codes[keyword], None)
+        row = transitions[state]
+        for column, target in enumerate(row):
+            if target == errors[LexicalError.InvalidIdentifier]:
+                row[column] = errors[LexicalError.InvalidSyntax]
+
+    # special symbols and keywords spelled with symbols (<=, =>) form a second trie,
+    # a symbol token always ends as soon as no longer symbol matches
+    for symbol in specialSymbols + [k for k in keywords if CHAR_CLASSES[ord(k[0])] != LETTER]:
+        state = start
+        for char in symbol:
+            target = transitions[state][ord(char)]
+            if target == STOP or target == unrecognized:
+                target = newState(INVALID, unknown, LexicalError.UnrecognizedSymbol)
+                transitions[state][ord(char)] = target
+            state = target
+        accepts[state] = (SS if symbol in specialSymbols else KEY, codes[symbol], None)
+
+    return transitions, accepts
+
+
+def buildPattern():
+    """
+    build a single master regular expression recognizing every token class,
+    the name of the matched group gives the class of the token.
+    identifiers, keywords and constants also capture the characters up to the
+    next separator, which are not empty when the token is invalid
+    """
+    keywords = KEYWORDS
+    specialSymbols = SPECIAL_SYMBOLS
+    separators = re.escape(WHITESPACE + "#" + "".join(specialSymbols))
+
+    # longest symbols first so that <= and => win over < and =
+    symbols = sorted(specialSymbols + [k for k in keywords if CHAR_CLASSES[ord(k[0])] != LETTER], key=len, reverse=True)
+
+    return re.compile("|".join([
+        r"(?P<WS>[ \t\r\n]+)",
+        r"(?P<COMMENT>#[^\r\n]*)",
+        r"(?P<WORD>[a-zA-Z][a-zA-Z0-9.]*(?P<WORDTAIL>[^%s]*))" % separators,
+        r"(?P<CONST>[0-9]+(?:\.[0-9]*)?(?P<CONSTTAIL>[^%s]*))" % separators,
+        r"(?P<SYMBOL>%s)" % "|".join(re.escape(symbol) for symbol in symbols),
+        r"(?P<OTHER>[\x80-\xff][\x80-\xbf]*|.)",
+    ]).encode("latin-1"), re.DOTALL)
+
+
+def openSource(sourceFile):
+    """
+    returns the bytes of the source code: a file path is memory-mapped,
+    an in-memory bytes buffer is used as it is
+    """
+    if isinstance(sourceFile, (bytes, bytearray, mmap.mmap)):
+        return sourceFile
+    if isinstance(sourceFile, memoryview):
+        return sourceFile.tobytes()
+
+    with open(sourceFile, 'rb') as source:
+        try:
+            return mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty files can't be mapped
+            return b""
 
 
 class Scanner:
     """
     The scanner module for compiler
     """
-    def __init__(self, sourceFile):
-        self.sourceCode = open(sourceFile, 'r')  #source code to be scanned
-        self.lineNum = 1  # counter for line number
-        self.lexeme = ""  #buffer to store scanned character
-        self.tokens = []  # store next recognized tokens
-        self.lexicalError = None
-        self.tokenBuffer = ""
-
-    def getNextValidChar(self):
+    # lexer backends, selected when the scanner is constructed
+    engines = ("dfa", "regex")
+
+    # tables shared by every scanner, built on first use from the parser's terminals
+    transitions = None
+    accepts = None
+    pattern = None
+    keywords = None
+    specialSymbols = None
+    signature = None  # scanner version and terminals, part of the token cache key
+
+    @staticmethod
+    def loadTables():
         """
-        returns next non-space and non-comment character
+        build the tables shared by every scanner the first time they are needed
         """
-        char = self.sourceCode.read(1)  # read next character
-
-        while True:
-            if char == '\t' or char == ' ':  # tab or space
-                char = self.sourceCode.read(1)
-            elif char == '\n' or char == '\r':  # newline or carriage return
-                self.lineNum += 1
-                char = self.sourceCode.read(1)
-            elif char == '#':  # comment character, ignore everything after it
-                self.sourceCode.readline()  # skip rest of this line
-                self.lineNum += 1  # increment line number
-                char = self.sourceCode.read(1)  # read first character of next line
-            else:
-                break  # anything none space or comment line will break
-        return char
-
-    def nextToken(self):
+        if Scanner.transitions is None:
+            Scanner.transitions, Scanner.accepts = buildTransitions()
+            Scanner.pattern = buildPattern()
+            Scanner.keywords = frozenset(KEYWORDS)
+            Scanner.specialSymbols = tuple(SPECIAL_SYMBOLS)
+            Scanner.signature = "%d %s" % (SCANNER_VERSION, " ".join(KEYWORDS + SPECIAL_SYMBOLS))
+
+    def __init__(self, sourceFile, engine="dfa", cache=False, text=False):
         """
-        scan character by character to find the next token using DFA
-        token separators are space and special symbols
-        when a special symbol is concatenate with another token, the second
-        token is stored in a buffer to be return in next function call
+        sourceFile is a file path or a bytes buffer, or with text a string of
+        source code. when cache is set the token stream of a file is loaded
+        from (or saved to) the on-disk token cache, next to the file or in the
+        directory cache names
         """
-        # if token buffer not empyt, return that token
-        if self.tokenBuffer:
-            temp = self.tokenBuffer
-            self.tokenBuffer = ""
-            return temp
-
-        # initial variables for new token
-        self.lexeme = ""
-        self.tokens = []
-        self.lexicalError = None
-
-
-        char = self.getNextValidChar()
-        if not char:  # end of the file found
-            return None
-
-        self.lexeme += char  # keep track of scanned char before a token found
-
-        # side comments indicate starting symbol might lead to possible keyword or SS
-        if char == 'p':  # package, private, protected, print
-            self.block_p()
-        elif char == 'i':  # import, if, in, int
-            self.block_i()
-        elif char == 'a':  # abstract, and
-            self.block_a()
-        elif char == 'f':  # final, false
-            self.block_f()
-        elif char == 's':  # sealed
-            self.block_s()
-        elif char == 'c':  # class, case
-            self.block_c()
-        elif char == 'o':  # object, or
-            self.block_o()
-        elif char == 'v':  # val
-            self.block_v()
-        elif char == 'd':  # def
-            self.block_d()
-        elif char == 'e':  # else
-            self.block_e()
-        elif char == 'n':  # not
-            self.block_n()
-        elif char == 'w':  # while
-            self.block_w()
-        elif char == 'r':  # return, real
-            self.block_r()
-        elif char == 't':  # true
-            self.block_t()
-        elif char == 'b':  # bool
-            self.block_b()
-        elif char == '<':  # <=
-            self.block_leftAssignment()
-        elif char == '=':  # =>
-            self.block_rightAssignment()
-        elif re.match("[a-zA-Z]", char):  # identifier start with english letter
-            self.block_identifiers()
-        elif re.match("[;{}():,=+*@]", char):  # a special symbol
-            token = Token(self.lexeme, "SS", self.lineNum)
-            self.tokens.append(token)
-        elif re.match("[0-9]", char):  # constants
-            self.block_constants()
-        else:
-            token = Token(char, "INVALID", self.lineNum)
-            token.lexicalError = LexicalError.UnrecognizedSymbol
-            self.tokens.append(token)
+        if engine not in Scanner.engines:
+            raise ValueError("Unknown scanner engine: %s" % engine)
 
-        if len(self.tokens) > 1:
-            self.tokenBuffer = self.tokens[1]
+        Scanner.loadTables()
+        self.engine = engine
+        self.cache = cache
+        self.stream = None
+        self.reset(sourceFile, text)
 
-        return self.tokens[0]
-
-    def errorHandler(self, error):
+    def reset(self, sourceFile, text=False):
         """
-        produce appropriate error messages for the token
+        start scanning another source with the same scanner, sourceFile is
+        a file path or a bytes buffer, or with text a string of source code
         """
-        if error == LexicalError.InvalidSyntax:
-            return "Invalid Syntax"
-        elif error == LexicalError.InvalidIdentifier:
-            return "Identifier contains invalid symbol"
-        elif error == LexicalError.InvalidConstant:
-            return "Constant follow by none digit or decimal character"
-        elif error == LexicalError.UnrecognizedSymbol:
-            return "Invalid symbol"
-        elif error == LexicalError.MultipleDecimals:
-            return "constant contains more than one decimal point"
-
-    def invalidToken(self):
-        while True:  # keep scanning until a token separator is found
-            char = self.sourceCode.read(1)
-            self.lexeme += char
-            if char == ' ':
-                token = Token(self.lexeme[:-1], "INVALID", self.lineNum)
-                token.lexicalError = self.lexicalError
-                self.tokens.append(token)
-                break
-            elif re.match("[#;{}():,=+*@]", char):
-                token = Token(self.lexeme[:-1], "INVALID", self.lineNum)
-                token.lexicalError = self.lexicalError
-                ssToken = Token(char, "SS", self.lineNum)
-                self.tokens.append(token)
-                self.tokens.append(ssToken)
-                break
-
-    def block_constants(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.raw.close()
+        if text:
+            sourceFile = sourceFile.encode("utf-8")
+        self.sourceCode = openSource(sourceFile)  #source code to be scanned
+        self.position = 0  # cursor, offset of the next byte to scan
+        self.end = len(self.sourceCode)  # offset where scanning stops
+        self.lineIndex = LineIndex(self.sourceCode)  # line numbers of the offsets
+
+        # token stream shared by nextToken(), tokens(), next_tokens() and scanBuffer()
+        if self.engine == "regex":
+            self.raw = self.scanRegex()
+        else:
+            self.raw = self.scanDFA()
+
+        if self.cache and isinstance(sourceFile, str):
+            cacheDir = self.cache if isinstance(self.cache, str) else None
+            key = tokencache.sourceKey(self.sourceCode, Scanner.signature)
+            tokens = tokencache.load(sourceFile, key, self.sourceCode, self.lineIndex, cacheDir)
+            if tokens is None:  # source changed or never scanned
+                tokens = self.scanBuffer()
+                tokencache.store(sourceFile, key, tokens, cacheDir)
+            self.raw = self.replayBuffer(tokens)
+
+        self.stream = self.makeTokens(self.raw)
+
+    def close(self):
         """
-        states for any possible combination of constants
-        that is string of digits have no more than one decimal point
+        stop scanning and release the source buffer, a memory-mapped file is
+        unmapped once the tokens read from it are gone
         """
-        decimalPointUsed = False
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        while True:  # keep scanning as long as it form a valid constant
-            if re.match("[0-9]", char):  #regular expression to match any digit
-                char = self.sourceCode.read(1)
-                self.lexeme += char
-            elif char == '.' and not decimalPointUsed:
-                char = self.sourceCode.read(1)
-                self.lexeme += char
-                decimalPointUsed = True
-            else:
-                break
-
-        if char == ' ':  # space found, return the token
-            token = Token(self.lexeme[:-1], "CONST", self.lineNum)
-            self.tokens.append(token)  #add token to the list
-        elif re.match("[#;{}():,=+*@]", char):  # next char is a special symbol
-            token = Token(self.lexeme[:-1], "CONST", self.lineNum)
-            ssToken = Token(char, "SS", self.lineNum)
-            self.tokens.append(token)  # add both token and special symbol to the list
-            self.tokens.append(ssToken)
-        elif char == '.':
-            self.lexicalError = LexicalError.MultipleDecimals
-            self.invalidToken()
-        else:
-            self.lexicalError = LexicalError.InvalidConstant
-            self.invalidToken()
+        self.stream.close()
+        self.raw.close()
+        self.sourceCode = None
 
-    def block_identifiers(self):
+    @property
+    def lineNum(self):
         """
-        States for any possible combination of identifiers:
-        Any nonempty string fo English letters, digits, and/or periods that
-        begins with a letter and is not a a keyword
+        line number of the cursor
         """
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        while re.match("[a-zA-Z0-9.]", char):  #consume next char as long it forms valid ID
-            char = self.sourceCode.read(1)
-            self.lexeme += char
-
-        if char == ' ':
-            token = Token(self.lexeme[:-1], "ID", self.lineNum)
-            self.tokens.append(token)
-        elif re.match("[#;{}():,=+*@]", char):  # next char is a special symbol
-            token = Token(self.lexeme[:-1], "ID", self.lineNum)
-            ssToken = Token(char, "SS", self.lineNum)
-            self.tokens.append(token)
-            self.tokens.append(ssToken)
-        else:
-            self.lexicalError = LexicalError.InvalidIdentifier
-            self.invalidToken()
+        return self.lineIndex.line(self.position)
 
-    def block_identifierOrError(self, char):
+    def seek(self, position, end=None):
         """
-        This helper function handles the case when scanned character does not lead to a keyword,
-        it takes one parameter of previously scanned char
+        continue scanning at a byte offset that is a token start or separator,
+        scanning stops at end, which must also be a separator, or at the end
+        of the source code, where the EOF token is produced
         """
-        if char == ' ':  # space, return as identifier
-            token = Token(self.lexeme[:-1], "ID", self.lineNum)  #remove last char (space) and store token
-            self.tokens.append(token)
-        elif re.match("[a-zA-Z0-9.]", char):  # some ongoing identifier
-            self.block_identifiers()
-        elif re.match("[;{}():,=+*@]", char):
-            # treat special symbol as a token separator, store both token and ss
-            token = Token(self.lexeme[:-1], "ID", self.lineNum)
-            ssToken = Token(char, "SS", self.lineNum)
-            self.tokens.append(token)
-            self.tokens.append(ssToken)
+        self.position = position
+        self.end = len(self.sourceCode) if end is None else end
+        if self.engine == "regex":
+            self.raw = self.scanRegex()
         else:
-            self.lexicalError = LexicalError.InvalidIdentifier
-            self.invalidToken()
+            self.raw = self.scanDFA()
+        self.stream = self.makeTokens(self.raw)
 
-    def keyAcceptingState(self):
+    def __iter__(self):
+        return self.stream
+
+    def tokens(self):
         """
-        This function is called when scanned characters lead to a accepting state as a keyword
+        returns a generator over the remaining tokens of the source code
         """
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == ' ':  # token separator, token is a keyword
-            token = Token(self.lexeme[:-1], "KEY", self.lineNum)
-            self.tokens.append(token)
-        elif re.match("[;{}():,=+*@]", char):  # keyword token follow by a SS
-            token = Token(self.lexeme[:-1], "KEY", self.lineNum)
-            ssToken = Token(char, "SS", self.lineNum)
-            self.tokens.append(token)
-            self.tokens.append(ssToken)
-        elif re.match("[a-zA-Z0-9.]", char):  # some ongoing identifier
-            self.block_identifiers()
-        else:
-            self.lexicalError = LexicalError.InvalidSyntax
-            self.invalidToken()
-
-
-    # each block_XXX function indicate a state that might lead to a keyword token
-    def block_rightAssignment(self):  # =>
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == '>':
-            token = Token(self.lexeme, "KEY", self.lineNum)
-            self.tokens.append(token)
-        else:
-            token = Token(self.lexeme[:-1], "SS", self.lineNum)
-            self.tokens.append(token)
-            self.sourceCode.seek(self.sourceCode.tell() - 1)
-
-    def block_leftAssignment(self):  # <=
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == '=':
-            token = Token(self.lexeme, "KEY", self.lineNum)
-            self.tokens.append(token)
-        else:
-            token = Token(self.lexeme[:-1], "INVALID", self.lineNum)
-            token.lexicalError = LexicalError.UnrecognizedSymbol
-            self.tokens.append(token)
-            self.sourceCode.seek(self.sourceCode.tell() - 1)
-
-    def block_boo(self):  # bool
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'l':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_bo(self):  # bool
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'o':
-            self.block_boo()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_b(self):  # bool
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'o':
-            self.block_bo()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_tru(self):  # true
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_tr(self):  # true
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'u':
-            self.block_tru()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_t(self):  # true
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'r':
-            self.block_tr()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_retur(self):  # return
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'n':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_retu(self):  # return
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'r':
-            self.block_retur()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_ret(self):  # return
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'u':
-            self.block_retu()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_rea(self):  # real
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'l':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_re(self):  # return, real
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'a':
-            self.block_rea()
-        elif char == 't':
-            self.block_ret()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_r(self):  # return, real
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.block_re()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_whil(self):  # while
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_whi(self):  # while
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'l':
-            self.block_whil()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_wh(self):  # while
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'i':
-            self.block_whi()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_w(self):  # while
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'h':
-            self.block_wh()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_no(self):  # not
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 't':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_n(self):  # not
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'o':
-            self.block_no()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_els(self):  # else
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_el(self):  # else
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 's':
-            self.block_els()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_e(self):  # else
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'l':
-            self.block_el()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_de(self):  # def
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'f':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_d(self):  # def
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.block_de()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_val(self):  # val
-        char = self.sourceCode.read(1)
-        if char == ' ':
-            token = Token(self.lexeme, "KEY", self.lineNum)
-            self.tokens.append(token)
-        else:
-            self.lexeme += char
-            self.block_identifierOrError(char)
-
-    def block_va(self):  # val
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'l':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_v(self):  # val
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'a':
-            self.block_va()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_objec(self):  # object
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 't':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_obje(self):  # object
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'c':
-            self.block_objec()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_obj(self):  # object
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.block_obje()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_ob(self):  # object
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'j':
-            self.block_obj()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_o(self):  # object, or
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'b':
-            self.block_ob()
-        elif char == 'r':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_cas(self):  # case
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_ca(self):  # case
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 's':
-            self.block_cas()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_clas(self):  # class
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 's':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
+        return self.stream
 
-    def block_cla(self):  # class
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 's':
-            self.block_clas()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_cl(self):  # class
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'a':
-            self.block_cla()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_c(self):  # class, case
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'l':  # class
-            self.block_cl()
-        elif char == 'a':  #case
-            self.block_ca()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_seale(self):  # sealed
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'd':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_seal(self):  # sealed
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.block_seale()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_sea(self):  # sealed
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'l':
-            self.block_seal()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_se(self):  # sealed
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'a':
-            self.block_sea()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_s(self):  # sealed
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.block_se()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_fals(self):  # false
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_fal(self):  # false
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 's':
-            self.block_fals()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_fa(self):  # false
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'l':
-            self.block_fal()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_final(self):  # final
-        char = self.sourceCode.read(1)
-        if char == ' ':
-            token = Token(self.lexeme, "KEY", self.lineNum)
-            self.tokens.append(token)
-        else:
-            self.lexeme += char
-            self.block_identifierOrError(char)
-
-    def block_fina(self):  # final
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'l':
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_fin(self):  # final
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'a':
-            self.block_fina()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_fi(self):  # final
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'n':
-            self.block_fin()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_f(self):  # final, false
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'i':
-            self.block_fi()
-        elif char == 'a':
-            self.block_fa()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_abstract(self):  # abstract
-        char = self.sourceCode.read(1)
-        if char == ' ':
-            token = Token(self.lexeme, "KEY", self.lineNum)
-            self.tokens.append(token)
-        else:
-            self.lexeme += char
-            self.block_identifierOrError(char)
-
-    def block_abstrac(self):  # abstract
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 't':  # abstract
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_abstra(self):  # abstract
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'c':  # abstract
-            self.block_abstrac()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_abstr(self):  # abstract
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'a':  # abstract
-            self.block_abstra()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_abst(self):  # abstract
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'r':  # abstract
-            self.block_abstr()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_abs(self):  # abstract
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 't':  # abstract
-            self.block_abst()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_ab(self):  # abstract
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 's':  # abstract
-            self.block_abs()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_and(self):
-        char = self.sourceCode.read(1)
-        if char == ' ':  # and
-            token = Token(self.lexeme, "KEY", self.lineNum)
-            self.tokens.append(token)
-        else:
-            self.lexeme += char
-            self.block_identifierOrError(char)
-
-    def block_an(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'd':  # abstract
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_a(self):  # abstract, and
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'b':  # abstract
-            self.block_ab()
-        elif char == 'n':
-            self.block_an()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_in(self):  # in, int
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-
-        if char == ' ':  # in
-            token = Token(self.lexeme[:-1], "KEY", self.lineNum)
-            self.tokens.append(token)
-        elif char == 't':  # int
-            self.keyAcceptingState()
-        elif re.match("[#;{}():,=+*@]", char):  # next char is a special symbol
-            self.token = Token(self.lexeme[:-1], "KEY", self.lineNum)
-            self.specialSymbol = char
-        else:
-            self.block_identifierOrError(char)
-
-    def block_if(self):
-        char = self.sourceCode.read(1)
-        if char == ' ':  # if
-            token = Token(self.lexeme, "KEY", self.lineNum)
-            self.tokens.append(token)
-        else:
-            self.lexeme += char
-            self.block_identifierOrError(char)
-
-    def block_impor(self):  # import
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 't':  # import
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_impo(self):  # import
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'r':  # import
-            self.block_impor()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_imp(self):  # import
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'o':  # import
-            self.block_impo()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_im(self):  # import
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'p':  # import
-            self.block_imp()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_i(self):  # import, if, in, int
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'm':  # import
-            self.block_im()
-        elif char == 'f':  # if
-            self.keyAcceptingState()
-        elif char == 'n':  # in, int
-            self.block_in()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_packag(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':  # package
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_packa(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'g':  # package
-            self.block_packag()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_pack(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'a':  # package
-            self.block_packa()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_pac(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'k':  # package
-            self.block_pack()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_pa(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'c':  # package
-            self.block_pac()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_protecte(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'd':  # protected
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
+    def next_tokens(self, n):
+        """
+        returns a list of up to n next tokens, empty after the EOF token
+        """
+        return list(islice(self.stream, n))
 
-    def block_protect(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':  # protected
-            self.block_protecte()
-        else:
-            self.block_identifierOrError(char)
+    def nextToken(self):
+        """
+        returns the next token of the source code, the EOF token at the end
+        of the file and None after it
+        """
+        return next(self.stream, None)
 
-    def block_protec(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 't':  # protected
-            self.block_protect()
-        else:
-            self.block_identifierOrError(char)
+    def scanBuffer(self):
+        """
+        bulk mode: scan the remaining tokens into a columnar TokenBuffer
+        without creating a Token object per token
+        """
+        tokens = TokenBuffer(self.sourceCode, self.lineIndex)
+        append = tokens.append
+        for typeCode, code, error, start, end in self.raw:
+            append(typeCode, code, error, start, end)
+        return tokens
 
-    def block_prote(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'c':  # protected
-            self.block_protec()
-        else:
-            self.block_identifierOrError(char)
+    def replayBuffer(self, tokens):
+        """
+        yield the (type code, terminal code, error, start, end) tuples stored in a TokenBuffer
+        """
+        errors = map(ERRORS.__getitem__, tokens.errors)
+        yield from zip(tokens.types, tokens.codes, errors, tokens.starts, tokens.ends)
+        self.position = self.end
 
-    def block_prot(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':  # protected
-            self.block_prote()
-        else:
-            self.block_identifierOrError(char)
+    def makeTokens(self, raw):
+        """
+        turn the (type code, terminal code, error, start, end) tuples of an engine
+        into Tokens, their lexeme and line number are read from the source when needed
+        """
+        index = self.lineIndex
+        for typeCode, code, error, start, end in raw:
+            token = Token(None, TOKEN_TYPES[typeCode], None, start, end, index, code)
+            token.lexicalError = error
+            yield token
 
-    def block_pro(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 't':  # protected
-            self.block_prot()
-        else:
-            self.block_identifierOrError(char)
+    def scanDFA(self):
+        """
+        scan character by character to find tokens using DFA
+        token separators are white space, comments and special symbols,
+        the cursor stops on the separator, which starts the next token
+        """
+        transitions = Scanner.transitions
+        accepts = Scanner.accepts
+        charClasses = CHAR_CLASSES
+        endOfInput = int(Terminal.END)
+        source = self.sourceCode
+        position = self.position
+        end = self.end
 
-    def block_privat(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'e':  # private
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
+        while True:
+            # skip to the next non-space and non-comment character
+            while position < end:
+                charClass = charClasses[source[position]]
+                if SPACE <= charClass <= RETURN:  # space, tab, newline or carriage return
+                    position += 1
+                elif charClass == COMMENT:  # ignore everything up to end of line
+                    newline = source.find(b"\n", position, end)
+                    if newline < 0:
+                        newline = end
+                    carriageReturn = source.find(b"\r", position, newline)
+                    position = newline if carriageReturn < 0 else carriageReturn
+                else:
+                    break  # anything none space or comment line will break
+            else:
+                self.position = position
+                if end == len(source):
+                    yield EOF, endOfInput, None, end, end
+                return  # end of the file found
+
+            start = position
+            state = START
+            while position < end:
+                nextState = transitions[state][source[position]]
+                if nextState == STOP:
+                    break
+                state = nextState
+                position += 1
+            self.position = position
+
+            typeCode, code, error = accepts[state]
+            yield typeCode, code, error, start, position
+
+    def scanRegex(self):
+        """
+        find tokens with the master regular expression over the whole buffer,
+        white space and comments are skipped
+        """
+        keywords = Scanner.keywords
+        codes = TERMINAL_CODES
+        unknown, identifier, constant = int(Terminal.UNKNOWN), int(Terminal.ID), int(Terminal.CONST)
+
+        for match in Scanner.pattern.finditer(self.sourceCode, self.position, self.end):
+            group = match.lastgroup
+
+            if group == "WS" or group == "COMMENT":
+                continue
+
+            error = None
+            code = unknown
+            if group == "WORD":
+                word = match.group()[:match.start("WORDTAIL") - match.start()].decode("ascii")
+                if match.group("WORDTAIL"):
+                    typeCode = INVALID
+                    if word in keywords:
+                        error = LexicalError.InvalidSyntax
+                    else:
+                        error = LexicalError.InvalidIdentifier
+                elif word in keywords:
+                    typeCode = KEY
+                    code = codes[word]
+                else:
+                    typeCode = ID
+                    code = identifier
+            elif group == "CONST":
+                tail = match.group("CONSTTAIL")
+                if tail:
+                    typeCode = INVALID
+                    if tail[0] == 46:  # period
+                        error = LexicalError.MultipleDecimals
+                    else:
+                        error = LexicalError.InvalidConstant
+                else:
+                    typeCode = CONST
+                    code = constant
+            elif group == "SYMBOL":
+                symbol = match.group().decode("ascii")
+                if symbol in keywords:  # <= and =>
+                    typeCode = KEY
+                else:
+                    typeCode = SS
+                code = codes[symbol]
+            else:
+                typeCode = INVALID
+                error = LexicalError.UnrecognizedSymbol
 
-    def block_priva(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 't':  # private
-            self.block_privat()
-        else:
-            self.block_identifierOrError(char)
+            self.position = match.end()
+            yield typeCode, code, error, match.start(), match.end()
 
-    def block_priv(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'a':  # private
-            self.block_priva()
-        else:
-            self.block_identifierOrError(char)
+        self.position = self.end
+        if self.end == len(self.sourceCode):
+            yield EOF, int(Terminal.END), None, self.end, self.end
 
-    def block_prin(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 't':  # print
-            self.keyAcceptingState()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_pri(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'v':  # private
-            self.block_priv()
-        elif char == 'n':  # print
-            self.block_prin()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_pr(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'i':  # private, print
-            self.block_pri()
-        elif char == 'o':  # protected
-            self.block_pro()
-        else:
-            self.block_identifierOrError(char)
-
-    def block_p(self):
-        char = self.sourceCode.read(1)
-        self.lexeme += char
-        if char == 'a':  # package
-            self.block_pa()
-        elif char == 'r':  # private, protected, print,
-            self.block_pr()
-        else:
-            self.block_identifierOrError(char)
+    def errorHandler(self, error):
+        """
+        produce appropriate error messages for the token
+        """
+        if error == LexicalError.InvalidSyntax:
+            return "Invalid Syntax"
+        elif error == LexicalError.InvalidIdentifier:
+            return "Identifier contains invalid symbol"
+        elif error == LexicalError.InvalidConstant:
+            return "Constant follow by none digit or decimal character"
+        elif error == LexicalError.UnrecognizedSymbol:
+            return "Invalid symbol"
+        elif error == LexicalError.MultipleDecimals:
+            return "constant contains more than one decimal point"
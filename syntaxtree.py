@@ -0,0 +1,116 @@
+"""
+Syntax tree built by the parser
+
+The nodes of the tree are kept in a pool of arrays instead of one object per
+node: the kind of a node is its grammar symbol code, its children are linked
+through the first child and next sibling columns, and a terminal node holds
+the index of its token in the token buffer of the parse.
+"""
+from array import array
+
+from terminals import TOKEN_LOOKUP
+
+NONE = -1  # no child, no sibling or no token
+
+
+class SyntaxTree:
+    """
+    Array-backed node pool of a parse tree, node 0 is the root
+    """
+    def __init__(self, tokens=None):
+        self.tokens = tokens  # TokenBuffer (or Token list) the token indices refer to
+        self.kinds = array('b')
+        self.firstChild = array('i')
+        self.nextSibling = array('i')
+        self.tokenIndex = array('i')
+        self.bodies = {}  # rule body -> (children kinds, NONE column), reused by expand
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def addNode(self, kind, tokenIndex=NONE):
+        """
+        add a node without children, returns its number
+        """
+        self.kinds.append(kind)
+        self.firstChild.append(NONE)
+        self.nextSibling.append(NONE)
+        self.tokenIndex.append(tokenIndex)
+        return len(self.kinds) - 1
+
+    def expand(self, node, body, nodeStack):
+        """
+        add the children of a node expanded by a rule, body is the rule body
+        reversed (as pushed on the parse stack). the children are pushed on the
+        node stack in the same order as their symbols on the parse stack
+        """
+        try:
+            kinds, nones = self.bodies[body]
+        except KeyError:
+            kinds = array('b', body[::-1])
+            nones = array('i', [NONE]) * len(body)
+            self.bodies[body] = kinds, nones
+        if not kinds:
+            return
+        first = len(self.kinds)
+        last = first + len(kinds) - 1
+        self.firstChild[node] = first
+        self.kinds += kinds
+        self.firstChild += nones
+        self.tokenIndex += nones
+        self.nextSibling.extend(range(first + 1, last + 1))
+        self.nextSibling.append(NONE)
+        nodeStack.extend(range(last, first - 1, -1))
+
+    def children(self, node):
+        """
+        yield the children of a node in order
+        """
+        child = self.firstChild[node]
+        while child != NONE:
+            yield child
+            child = self.nextSibling[child]
+
+    def walk(self, node=0):
+        """
+        yield (node, depth) for the nodes of a subtree in preorder
+        """
+        firstChild = self.firstChild
+        nextSibling = self.nextSibling
+        stack = [(node, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+            # the next sibling comes after the subtree of the node, the
+            # siblings of the subtree root are not part of the walk
+            if depth and nextSibling[node] != NONE:
+                stack.append((nextSibling[node], depth))
+            child = firstChild[node]
+            if child != NONE:
+                stack.append((child, depth + 1))
+
+    def token(self, node):
+        """
+        returns the token of a terminal node, None for other nodes
+        """
+        index = self.tokenIndex[node]
+        if index == NONE or self.tokens is None:
+            return None
+        return self.tokens[index]
+
+    def name(self, node):
+        """
+        returns the grammar symbol of a node, <dcl>, [id], ...
+        """
+        return TOKEN_LOOKUP[self.kinds[node]]
+
+    def dump(self, output, node=0):
+        """
+        write the subtree as indented text, terminals with their lexeme
+        """
+        for node, depth in self.walk(node):
+            token = self.token(node)
+            if token is None:
+                output.write("%s%s\n" % ("  " * depth, self.name(node)))
+            else:
+                output.write("%s%s %s\n" % ("  " * depth, self.name(node), token.lexeme))
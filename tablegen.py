@@ -0,0 +1,238 @@
+"""
+LL(1) parse table generator
+
+The parse table is computed from the grammar rules: FIRST sets of the
+symbols, FOLLOW sets of the non-terminals, and for every rule A -> body the
+cells (A, a) for a in FIRST(body), plus FOLLOW(A) when body derives epsilon.
+Two rules in the same cell are an LL(1) conflict.
+
+The generated tables are cached in a marshal file next to this module and
+only generated again when the grammar hash changes.
+
+usage: python tablegen.py  (prints the FIRST/FOLLOW sets and the conflicts)
+"""
+import hashlib
+import marshal
+import os
+
+from terminals import TOKEN_LOOKUP, Terminal
+
+# bump when the generated tables change for the same grammar
+TABLEGEN_VERSION = 2
+
+EPSILON = -1
+START_SYMBOL = 42  # <scala>
+
+# columns of the dense parse table: one per grammar symbol code plus column 0
+# for the lookahead -1 of tokens that are not terminals
+TABLE_COLUMNS = len(TOKEN_LOOKUP) + 1
+
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_table.marshal")
+
+
+def nonterminals(rule_heads):
+    """
+    returns the sorted non-terminal symbols of the grammar
+    """
+    return sorted(set(rule_heads.values()))
+
+
+def splitRules(grammar_rules):
+    """
+    returns (syntax rules, rule heads) of the rules grouped by their head:
+    rule number -> body and rule number -> head non-terminal
+    """
+    syntax_rules = {}
+    rule_heads = {}
+    for head, rules in grammar_rules.items():
+        for ruleNum, body in rules.items():
+            if ruleNum in syntax_rules:
+                raise ValueError("Rule %d is a rule of both %s and %s" %
+                                 (ruleNum, TOKEN_LOOKUP[rule_heads[ruleNum]], TOKEN_LOOKUP[head]))
+            syntax_rules[ruleNum] = body
+            rule_heads[ruleNum] = head
+    return syntax_rules, rule_heads
+
+
+def checkRules(rule_heads, syntax_rules):
+    """
+    raise ValueError when a rule has a body but no head, or a head but no body
+    """
+    if rule_heads.keys() != syntax_rules.keys():
+        raise ValueError("Rules without a head: %s, rules without a body: %s" %
+                         (sorted(syntax_rules.keys() - rule_heads.keys()) or "none",
+                          sorted(rule_heads.keys() - syntax_rules.keys()) or "none"))
+
+
+def firstOfBody(body, first):
+    """
+    returns the FIRST set of a sequence of symbols, with EPSILON when the
+    whole sequence derives the empty string
+    """
+    result = set()
+    for item in body:
+        if item == EPSILON:
+            continue
+        if item not in first:  # terminal
+            result.add(item)
+            return result
+        result.update(first[item] - {EPSILON})
+        if EPSILON not in first[item]:
+            return result
+    result.add(EPSILON)
+    return result
+
+
+def firstSets(rule_heads, syntax_rules):
+    """
+    returns the FIRST set of every non-terminal, EPSILON marks the nullable ones
+    """
+    first = dict((symbol, set()) for symbol in nonterminals(rule_heads))
+    changed = True
+    while changed:
+        changed = False
+        for ruleNum, body in syntax_rules.items():
+            head = first[rule_heads[ruleNum]]
+            size = len(head)
+            head.update(firstOfBody(body, first))
+            changed = changed or len(head) != size
+    return first
+
+
+def followSets(rule_heads, syntax_rules, first, start=START_SYMBOL):
+    """
+    returns the FOLLOW set of every non-terminal, the end marker $ follows
+    the start symbol
+    """
+    follow = dict((symbol, set()) for symbol in first)
+    follow[start].add(int(Terminal.END))
+    changed = True
+    while changed:
+        changed = False
+        for ruleNum, body in syntax_rules.items():
+            for i, item in enumerate(body):
+                if item not in follow:  # terminal or epsilon
+                    continue
+                size = len(follow[item])
+                rest = firstOfBody(body[i + 1:], first)
+                follow[item].update(rest - {EPSILON})
+                if EPSILON in rest:
+                    follow[item].update(follow[rule_heads[ruleNum]])
+                changed = changed or len(follow[item]) != size
+    return follow
+
+
+def buildTable(rule_heads, syntax_rules, first, follow):
+    """
+    returns the parse table (non-terminal -> terminal -> rule number) and the
+    list of LL(1) conflicts as (non-terminal, terminal, rule numbers) tuples.
+    a conflicting cell keeps the lowest rule number
+    """
+
+    cells = {}
+    for ruleNum in sorted(syntax_rules):
+        head = rule_heads[ruleNum]
+        lookaheads = firstOfBody(syntax_rules[ruleNum], first)
+        if EPSILON in lookaheads:
+            lookaheads = (lookaheads - {EPSILON}) | follow[head]
+        for lookahead in lookaheads:
+            cells.setdefault((head, lookahead), []).append(ruleNum)
+
+    table = dict((symbol, {}) for symbol in first)
+    conflicts = []
+    for (head, lookahead), rules in sorted(cells.items()):
+        table[head][lookahead] = rules[0]
+        if len(rules) > 1:
+            conflicts.append((head, lookahead, rules))
+    return table, conflicts
+
+
+def compileRules(syntax_rules):
+    """
+    returns the rule bodies indexed by rule number, already reversed for the
+    stack and without epsilon (-1)
+    """
+    bodies = [()] * (max(syntax_rules) + 1)
+    for ruleNum, items in syntax_rules.items():
+        bodies[ruleNum] = tuple(item for item in reversed(items) if item != EPSILON)
+    return bodies
+
+
+def compileTable(parse_table):
+    """
+    returns the parse table as a flat list indexed by
+    stack top * TABLE_COLUMNS + lookahead + 1, -1 where there is no rule
+    """
+    table = [-1] * (len(TOKEN_LOOKUP) * TABLE_COLUMNS)
+    for stackTop, row in parse_table.items():
+        for lookahead, ruleNum in row.items():
+            table[stackTop * TABLE_COLUMNS + lookahead + 1] = ruleNum
+    return table
+
+
+def grammarHash(rule_heads, syntax_rules):
+    """
+    returns the hash of the grammar and of the generator version
+    """
+    grammar = (TABLEGEN_VERSION, TOKEN_LOOKUP, sorted(rule_heads.items()), sorted(syntax_rules.items()))
+    return hashlib.sha256(repr(grammar).encode("utf-8")).digest()
+
+
+def reportConflicts(conflicts):
+    """
+    print the LL(1) conflicts of the grammar
+    """
+    for head, lookahead, rules in conflicts:
+        print ("LL(1) conflict: %s with lookahead %s has rules %s" %
+               (TOKEN_LOOKUP[head], TOKEN_LOOKUP[lookahead], ", ".join(str(rule) for rule in rules)))
+
+
+def loadTables(rule_heads, syntax_rules, path=CACHE_FILE):
+    """
+    returns (parse table, dense table, rule bodies, follow sets) from the cache
+    file, they are generated and cached again when the grammar changed
+    """
+    checkRules(rule_heads, syntax_rules)
+    key = grammarHash(rule_heads, syntax_rules)
+    try:
+        with open(path, "rb") as cache:
+            cachedKey, parse_table, dense_table, rule_bodies, follow = marshal.loads(cache.read())
+        if cachedKey == key:
+            return parse_table, dense_table, rule_bodies, follow
+    except (OSError, EOFError, ValueError, TypeError):
+        pass  # no cache yet or unreadable, generate it
+
+    first = firstSets(rule_heads, syntax_rules)
+    follow = followSets(rule_heads, syntax_rules, first)
+    parse_table, conflicts = buildTable(rule_heads, syntax_rules, first, follow)
+    reportConflicts(conflicts)
+    dense_table = compileTable(parse_table)
+    rule_bodies = compileRules(syntax_rules)
+    follow = dict((symbol, frozenset(items)) for symbol, items in follow.items())
+
+    try:
+        temp = path + ".%d" % os.getpid()
+        with open(temp, "wb") as cache:
+            marshal.dump((key, parse_table, dense_table, rule_bodies, follow), cache)
+        os.replace(temp, path)
+    except OSError:
+        pass  # read-only install, tables are generated at every start
+    return parse_table, dense_table, rule_bodies, follow
+
+
+def main():
+    from parser import Parser
+    first = firstSets(Parser.rule_heads, Parser.syntax_rules)
+    follow = followSets(Parser.rule_heads, Parser.syntax_rules, first)
+    for symbol in sorted(first):
+        print ("{:<16} FIRST  {}".format(TOKEN_LOOKUP[symbol],
+               " ".join("eps" if item == EPSILON else TOKEN_LOOKUP[item] for item in sorted(first[symbol]))))
+        print ("{:<16} FOLLOW {}".format("", " ".join(TOKEN_LOOKUP[item] for item in sorted(follow[symbol]))))
+
+    table, conflicts = buildTable(Parser.rule_heads, Parser.syntax_rules, first, follow)
+    reportConflicts(conflicts)
+    print ("%d conflicts" % len(conflicts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Integer coding of the grammar symbols shared by the scanner and the parser
+
+The code of a symbol is its index in TOKEN_LOOKUP: terminals are 1 to 41,
+non-terminals 42 to 69, Z0 is the stack bottom marker and $ the end marker.
+"""
+from enum import IntEnum
+
+# integer coding of tokens, corresponding to index of token
+TOKEN_LOOKUP = ["Z0","[id]","[const]","package", "import","abstract","final","sealed","private",
+                "protected","class","object","val","def","<=","if","else","while","case","=>","in",
+                "print","return","not","true","false","and","or","int","real","bool",
+                ";","{","}","(", ")",":",",","=","+","*","@",
+                "<scala>","<packages>","<imports>","<scala-body>","<subbody>","<modifier>",
+                "<subbody-tail>","<tail-type>","<block>","<stmts>","<stmt>","<dcl>","<dcl-tail>",
+                "<ids>","<more-ids>","<type>","<asmt>","<if>","<while>","<case>","<in>","<out>",
+                "<return>","<expr>","<arith-expr>","<arith>","<bool-expr>","<bool>","$"]
+
+
+class Terminal(IntEnum):
+    """
+    codes of the terminal symbols, a token carries the code of its terminal
+    """
+    UNKNOWN = -1  # invalid token, not a terminal of the grammar
+    Z0 = 0
+    ID = 1
+    CONST = 2
+    PACKAGE = 3
+    IMPORT = 4
+    ABSTRACT = 5
+    FINAL = 6
+    SEALED = 7
+    PRIVATE = 8
+    PROTECTED = 9
+    CLASS = 10
+    OBJECT = 11
+    VAL = 12
+    DEF = 13
+    LESS_EQUAL = 14
+    IF = 15
+    ELSE = 16
+    WHILE = 17
+    CASE = 18
+    ARROW = 19
+    IN = 20
+    PRINT = 21
+    RETURN = 22
+    NOT = 23
+    TRUE = 24
+    FALSE = 25
+    AND = 26
+    OR = 27
+    INT = 28
+    REAL = 29
+    BOOL = 30
+    SEMICOLON = 31
+    LEFT_BRACE = 32
+    RIGHT_BRACE = 33
+    LEFT_PAREN = 34
+    RIGHT_PAREN = 35
+    COLON = 36
+    COMMA = 37
+    ASSIGN = 38
+    PLUS = 39
+    TIMES = 40
+    AT = 41
+    END = 70
+
+
+# keywords and special symbols as spelled in the source code
+KEYWORDS = TOKEN_LOOKUP[Terminal.PACKAGE:Terminal.SEMICOLON]
+SPECIAL_SYMBOLS = TOKEN_LOOKUP[Terminal.SEMICOLON:Terminal.AT + 1]
+
+# terminal code of every keyword and special symbol
+TERMINAL_CODES = dict((lexeme, code) for code, lexeme in enumerate(TOKEN_LOOKUP)
+                      if Terminal.PACKAGE <= code <= Terminal.AT)
@@ -0,0 +1,217 @@
+"""
+Equivalence tests of the scanner and parser engines
+
+Seeded random sources are scanned and parsed by every engine: the regex,
+parallel, vectorized and incremental scanners must give the tokens of the
+sequential DFA scanner, and the recursive-descent and incremental parsers
+the results of the table-driven parser.
+
+usage: python -m unittest test_engines
+"""
+import contextlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from incremental import IncrementalScanner
+from incrementalparse import IncrementalParser
+import parallelscan
+from parser import Parser
+from parsetrace import TraceLevel
+from scanner import Scanner
+from tablegen import EPSILON, START_SYMBOL
+from terminals import KEYWORDS, TOKEN_LOOKUP, Terminal
+import vectorscan
+
+SEED = 4323
+
+# pieces of random source text: letters, digits, symbols, keywords, comments,
+# line breaks of every kind and bytes that are not tokens
+PIECES = list("abcdefghilnoprstuvwxyzABZ0123456789.  \n\t#;{}():,=+*@<>$\x0b") + \
+    KEYWORDS + ["\r\n", "\r", "é", "...", "<=", ">="]
+
+# spellings of the terminals that are not keywords or symbols
+SPELLINGS = {Terminal.ID: ["a", "b", "x1", "foo.bar"], Terminal.CONST: ["1", "2.5", "30"]}
+
+
+def randomText(rnd, size):
+    """
+    returns size random pieces of source text
+    """
+    return "".join(rnd.choice(PIECES) for i in range(size))
+
+
+def derive(rnd, symbol, depth, output):
+    """
+    append the terminals of a random derivation of a grammar symbol, the
+    shortest rules are taken once the derivation is deep
+    """
+    if symbol not in Parser.parse_table:
+        output.append(rnd.choice(SPELLINGS[symbol]) if symbol in SPELLINGS else TOKEN_LOOKUP[symbol])
+        return
+    rules = [ruleNum for ruleNum, head in Parser.rule_heads.items() if head == symbol]
+    if depth > 8:
+        rules.sort(key=lambda ruleNum: sum(item in Parser.parse_table for item in Parser.syntax_rules[ruleNum]))
+        rules = rules[:1]
+    for item in Parser.syntax_rules[rnd.choice(rules)]:
+        if item != EPSILON:
+            derive(rnd, item, depth + 1, output)
+
+
+def randomProgram(rnd):
+    """
+    returns a random program of the grammar, with a token deleted, inserted
+    or the program cut short half of the time
+    """
+    tokens = []
+    derive(rnd, START_SYMBOL, 0, tokens)
+    if rnd.random() < 0.5:
+        i = rnd.randrange(len(tokens) + 1)
+        change = rnd.random()
+        if change < 0.4 and i < len(tokens):
+            del tokens[i]
+        elif change < 0.8:
+            tokens.insert(i, rnd.choice(TOKEN_LOOKUP[1:42]) if rnd.random() < 0.9 else "1a")
+        else:
+            tokens = tokens[:i]
+    return "".join(token + rnd.choice([" ", " ", "\n", "  \n "]) for token in tokens)
+
+
+def bufferColumns(tokens):
+    """
+    returns the columns of a TokenBuffer as lists
+    """
+    return [list(column) for column in tokens.columns()]
+
+
+def tokenFields(tokens):
+    """
+    returns the lexeme, type, line, offsets and code of every token
+    """
+    return [(token.lexeme, token.type, token.lineNum, token.start, token.end, token.code) for token in tokens]
+
+
+class ScannerEngineTest(unittest.TestCase):
+    """
+    every scanner gives the tokens of the sequential DFA scanner
+    """
+    def setUp(self):
+        self.rnd = random.Random(SEED)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sources(self, count, size):
+        for i in range(count):
+            yield randomText(self.rnd, self.rnd.randint(0, size)).encode("utf-8")
+
+    def testRegexScanner(self):
+        for source in self.sources(300, 200):
+            self.assertEqual(bufferColumns(Scanner(source, "regex").scanBuffer()),
+                             bufferColumns(Scanner(source).scanBuffer()), source)
+
+    @unittest.skipIf(vectorscan.numpy is None, "the vectorized scanner needs NumPy")
+    def testVectorizedScanner(self):
+        for source in self.sources(300, 200):
+            self.assertEqual(bufferColumns(vectorscan.scanVectorized(source)),
+                             bufferColumns(Scanner(source).scanBuffer()), source)
+
+    def testParallelScanner(self):
+        chunkSize = parallelscan.MIN_CHUNK_SIZE
+        parallelscan.MIN_CHUNK_SIZE = 64  # small files are cut in chunks as well
+        try:
+            path = os.path.join(self.directory, "source.txt")
+            for source in self.sources(5, 3000):
+                with open(path, "wb") as output:
+                    output.write(source)
+                self.assertEqual(bufferColumns(parallelscan.scanParallel(path, jobs=3)),
+                                 bufferColumns(Scanner(source).scanBuffer()), source)
+        finally:
+            parallelscan.MIN_CHUNK_SIZE = chunkSize
+
+    def testIncrementalScanner(self):
+        rnd = self.rnd
+        for source in self.sources(20, 300):
+            scanner = IncrementalScanner(source)
+            for i in range(30):
+                offset = rnd.randint(0, len(source))
+                deleted = min(rnd.choice([0, 0, 1, 2, 5, 20]), len(source) - offset)
+                inserted = randomText(rnd, rnd.randint(0, 3)).encode("utf-8")
+                source = source[:offset] + inserted + source[offset + deleted:]
+                scanner.edit(offset, deleted, inserted)
+                self.assertEqual(tokenFields(scanner.tokens()), tokenFields(Scanner(source)), source)
+
+
+class ParserEngineTest(unittest.TestCase):
+    """
+    every parser engine gives the results of the table-driven parser
+    """
+    def setUp(self):
+        self.rnd = random.Random(SEED)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def parse(self, source, engine, trace, buildTree):
+        """
+        returns the acceptance, diagnostics, trace, symbol table and tree of a parse
+        """
+        tracePath = os.path.join(self.directory, "parse_output.txt")
+        if os.path.exists(tracePath):
+            os.remove(tracePath)
+        parser = Parser()
+        with contextlib.redirect_stdout(io.StringIO()):
+            accepted = parser.parsing(source, cache=False, trace=trace, tracePath=tracePath,
+                                      buildTree=buildTree, engine=engine, text=True)
+        traceText = None
+        if os.path.exists(tracePath):
+            with open(tracePath) as output:
+                traceText = output.read()
+        tree = None
+        if parser.tree is not None:
+            tree = [list(column) for column in (parser.tree.kinds, parser.tree.firstChild,
+                                                parser.tree.nextSibling, parser.tree.tokenIndex)]
+        return accepted, parser.diagnostics, traceText, list(parser.symtab.symtab.items()), tree
+
+    def testDescentParser(self):
+        for i in range(150):
+            source = randomProgram(self.rnd)
+            for trace, buildTree in ((TraceLevel.FULL, True), (TraceLevel.FULL, False), (TraceLevel.OFF, False)):
+                self.assertEqual(self.parse(source, "descent", trace, buildTree),
+                                 self.parse(source, "table", trace, buildTree), source)
+
+    def testIncrementalParser(self):
+        rnd = self.rnd
+        edits = ["private ", "final ", " ", "\n", "x", ";", "}", "{", "val a = 1", "abstract class A "]
+        for i in range(10):
+            source = "".join(randomProgram(rnd) for j in range(rnd.randint(1, 4)))
+            with contextlib.redirect_stdout(io.StringIO()):
+                incremental = IncrementalParser(source)
+            undo = []
+            for j in range(30):
+                if undo and rnd.random() < 0.5:
+                    offset, deleted, inserted = undo.pop()
+                else:
+                    offset = rnd.randint(0, len(source))
+                    deleted = min(rnd.choice([0, 0, 1, 2, 5]), len(source) - offset)
+                    inserted = rnd.choice(edits)
+                    undo.append((offset, len(inserted), source[offset:offset + deleted]))
+                source = source[:offset] + inserted + source[offset + deleted:]
+                with contextlib.redirect_stdout(io.StringIO()):
+                    incremental.edit(offset, deleted, inserted)
+                    fresh = IncrementalParser(source)
+                accepted, diagnostics, traceText, symbols, tree = self.parse(source, "table", TraceLevel.OFF, False)
+                self.assertEqual(incremental.accepted, accepted, source)
+                if accepted:
+                    self.assertEqual(list(incremental.symbols().items()), symbols, source)
+                self.assertEqual(incremental.starts, fresh.starts, source)
+                self.assertEqual(incremental.diagnostics(), fresh.diagnostics(), source)
+
+
+if __name__ == '__main__':
+    unittest.main()
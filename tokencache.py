@@ -0,0 +1,80 @@
+"""
+On-disk cache of scanned token streams
+
+The token buffer of a source file is stored in __tokencache__/<file>.tok next
+to the source file, or in a given cache directory as <hash of the file
+path>-<file>.tok, together with a key made of the hash of the source code
+and of the scanner version. A cached stream is only used when the key still
+matches, so an edited source file or a changed scanner is scanned again.
+"""
+import hashlib
+import os
+import struct
+import sys
+
+from tokens import TokenBuffer
+
+CACHE_DIR = "__tokencache__"
+MAGIC = b"TOKC"
+HEADER = struct.Struct("<4s32sQ")  # magic, key, number of tokens
+
+
+def cachePath(sourceFile, cacheDir=None):
+    """
+    returns the path of the cache file for the source file, next to it or
+    in cacheDir
+    """
+    path = os.path.abspath(sourceFile)
+    directory, name = os.path.split(path)
+    if cacheDir is not None:
+        # files of the same name from different directories share cacheDir
+        pathHash = hashlib.sha256(path.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+        return os.path.join(cacheDir, "%s-%s.tok" % (pathHash, name))
+    return os.path.join(directory, CACHE_DIR, name + ".tok")
+
+
+def sourceKey(source, version):
+    """
+    returns the cache key of the source code bytes for the given scanner version
+    """
+    digest = hashlib.sha256()
+    digest.update(("%s:%s:" % (version, sys.byteorder)).encode("ascii"))
+    digest.update(source)
+    return digest.digest()
+
+
+def load(sourceFile, key, source, lineIndex=None, cacheDir=None):
+    """
+    returns the cached TokenBuffer of the source file, None if there is no
+    cached stream for this key
+    """
+    try:
+        with open(cachePath(sourceFile, cacheDir), "rb") as cache:
+            magic, cachedKey, count = HEADER.unpack(cache.read(HEADER.size))
+            if magic != MAGIC or cachedKey != key:
+                return None
+
+            tokens = TokenBuffer(source, lineIndex)
+            for column in tokens.columns():
+                column.fromfile(cache, count)
+            return tokens
+    except (OSError, EOFError, struct.error):
+        return None
+
+
+def store(sourceFile, key, tokens, cacheDir=None):
+    """
+    write the TokenBuffer of the source file to the cache, a cache directory
+    that can't be written is ignored
+    """
+    path = cachePath(sourceFile, cacheDir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = path + ".%d" % os.getpid()
+        with open(temp, "wb") as cache:
+            cache.write(HEADER.pack(MAGIC, key, len(tokens)))
+            for column in tokens.columns():
+                column.tofile(cache)
+        os.replace(temp, path)
+    except OSError:
+        pass
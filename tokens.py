@@ -0,0 +1,180 @@
+from array import array
+from bisect import bisect_right
+from enum import Enum
+import re
+
+class LexicalError(Enum):
+    InvalidSyntax = 1 # any error not defined
+    InvalidIdentifier = 2  # identifier contains some unrecognized symbol
+    InvalidConstant = 3  # Starting with constant follow by a letter
+    UnrecognizedSymbol = 4  # symbol not recognized in our special symbols
+    MultipleDecimals = 5  # constant contains multiple decimal points
+
+
+# token types, the index of a type is its code in a token buffer
+# EOF is the type of the end of input token ending every token stream
+TOKEN_TYPES = ("KEY", "ID", "CONST", "SS", "INVALID", "EOF")
+KEY, ID, CONST, SS, INVALID, EOF = range(len(TOKEN_TYPES))
+
+# lexical errors by code, code 0 means no error
+ERRORS = [None] + sorted(LexicalError, key=lambda error: error.value)
+
+
+# a line ends at a newline, a carriage return or a CRLF pair
+LINE_BREAK = re.compile(rb"\r\n?|\n")
+
+
+class LineIndex:
+    """
+    Line start offsets of a source buffer, built once on the first position
+    query. an offset is turned into its line and column by bisection
+    """
+    def __init__(self, source):
+        self.source = source  # source code bytes the offsets refer to
+        self.starts = None  # offset of the first byte of every line
+        self.last = (0, 0, 1)  # (line start, offset, column) of the last column query
+
+    def build(self):
+        starts = array('q', [0])
+        starts.extend(match.end() for match in LINE_BREAK.finditer(self.source))
+        self.starts = starts
+        return starts
+
+    def line(self, offset):
+        """
+        returns the line number (from 1) of a byte offset
+        """
+        starts = self.starts if self.starts is not None else self.build()
+        return bisect_right(starts, offset)
+
+    def column(self, offset):
+        """
+        returns the column (from 1, in characters) of a byte offset
+        """
+        starts = self.starts if self.starts is not None else self.build()
+        lineStart = starts[bisect_right(starts, offset) - 1]
+        # the diagnostics of a long line ask for increasing offsets: count the
+        # characters from the last offset asked on the line, when it starts a
+        # character, instead of from the line start
+        lastStart, begin, column = self.last
+        if lastStart != lineStart or begin > offset or (begin < len(self.source) and self.source[begin] & 0xC0 == 0x80):
+            begin, column = lineStart, 1
+        column += len(self.source[begin:offset].decode("utf-8", "replace"))
+        self.last = (lineStart, offset, column)
+        return column
+
+    def position(self, offset):
+        """
+        returns the (line, column) pair of a byte offset
+        """
+        return self.line(offset), self.column(offset)
+
+
+class Token:
+    """
+    This represents a token.  It has a type, a lexeme, and line number
+    """
+    __slots__ = ("type", "code", "text", "line", "lexicalError", "start", "end", "index")
+
+    def __init__(self, lexeme, token_type, line_num=None, start=-1, end=-1, index=None, code=-1):
+        """
+        The Constructor to create a token with lexeme, type, and line number,
+        start and end are the offsets of the lexeme in the source code and code
+        is the terminal code of the token in the grammar (-1 for invalid tokens).
+        a token given the line index of the source code and no lexeme or line
+        number reads them from the source the first time they are needed
+        """
+        self.type = token_type
+        self.code = code
+        self.text = lexeme
+        self.line = line_num
+        self.lexicalError = None
+        self.start = start
+        self.end = end
+        self.index = index
+
+    @property
+    def lexeme(self):
+        if self.text is None:
+            self.text = self.index.source[self.start:self.end].decode("utf-8", "replace")
+        return self.text
+
+    @lexeme.setter
+    def lexeme(self, lexeme):
+        self.text = lexeme
+
+    @property
+    def lineNum(self):
+        if self.line is None:
+            self.line = self.index.line(self.start)
+        return self.line
+
+    @lineNum.setter
+    def lineNum(self, lineNum):
+        self.line = lineNum
+
+    @property
+    def column(self):
+        """
+        column of the first character of the token, None when the token
+        has no line index
+        """
+        if self.index is None:
+            return None
+        return self.index.column(self.start)
+
+
+class TokenBuffer:
+    """
+    Columnar storage for a whole token stream: type codes, terminal codes, error
+    codes and offsets are kept in arrays, lexemes stay in the source code and line numbers
+    come from its line index. Token objects are only created when a token is
+    read from the buffer
+    """
+    def __init__(self, source, lineIndex=None):
+        self.source = source  # source code bytes the offsets refer to
+        self.lineIndex = LineIndex(source) if lineIndex is None else lineIndex
+        self.types = array('b')
+        self.codes = array('b')
+        self.errors = array('b')
+        self.starts = array('q')
+        self.ends = array('q')
+
+    def append(self, typeCode, code, error, start, end):
+        """
+        add a token given its type code, terminal code, lexical error (or None)
+        and offsets
+        """
+        self.types.append(typeCode)
+        self.codes.append(code)
+        self.errors.append(error.value if error else 0)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def columns(self):
+        """
+        returns the arrays holding the token stream
+        """
+        return [self.types, self.codes, self.errors, self.starts, self.ends]
+
+    def __len__(self):
+        return len(self.types)
+
+    def lexeme(self, i):
+        """
+        returns the lexeme of the i-th token
+        """
+        return self.source[self.starts[i]:self.ends[i]].decode("utf-8", "replace")
+
+    def __getitem__(self, i):
+        """
+        returns a Token view of the i-th token
+        """
+        token = Token(None, TOKEN_TYPES[self.types[i]], None, self.starts[i], self.ends[i], self.lineIndex,
+                      self.codes[i])
+        token.lexicalError = ERRORS[self.errors[i]]
+        return token
+
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield self[i]
@@ -0,0 +1,279 @@
+"""
+Vectorized scanning of very large source files with NumPy
+
+The source is loaded as a uint8 array and every byte is classified through a
+lookup table. Comments, the runs of bytes that are not token separators and
+the special symbols are found with array operations. A run starting with a
+letter or a digit is one keyword, identifier, constant or invalid token and
+is classified with array reductions, Python only looks up keywords and
+error kinds. Runs starting with anything else and symbols that may be the
+start of a longer one (=>) are scanned with the scanner DFA one token at a
+time. The token stream is the same as the one of Scanner.scanBuffer().
+
+NumPy is optional, it is only needed by scanVectorized.
+"""
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from scanner import Scanner, openSource, CHAR_CLASSES, COLUMNS, LETTER, DIGIT, PERIOD, SPACE, NEWLINE, RETURN, START, STOP
+from terminals import TERMINAL_CODES, Terminal
+from tokens import TokenBuffer, LexicalError, KEY, ID, CONST, INVALID, EOF
+
+# byte kinds of the pre-pass
+RUN, BLANK, SYMBOL, HASH = range(4)
+
+# valid part of a run starting with a letter or a digit, the rest makes it invalid
+WORD = re.compile(rb"[a-zA-Z][a-zA-Z0-9.]*")
+NUMBER = re.compile(rb"[0-9]+(?:\.[0-9]*)?")
+
+
+def buildKinds(specialSymbols):
+    """
+    returns the 256-entry table giving the kind of every byte value
+    """
+    kinds = numpy.zeros(COLUMNS, dtype=numpy.uint8)  # RUN
+    for byte in range(COLUMNS):
+        if CHAR_CLASSES[byte] in (SPACE, NEWLINE, RETURN):
+            kinds[byte] = BLANK
+    for symbol in specialSymbols:
+        kinds[ord(symbol)] = SYMBOL
+    kinds[ord("#")] = HASH
+    return kinds
+
+
+def commentMask(data):
+    """
+    returns the boolean array of the bytes inside comments: the first # of a
+    line starts a comment, which ends at the next carriage return or newline
+    """
+    size = len(data)
+    breaks = numpy.flatnonzero((data == 10) | (data == 13))
+    hashes = numpy.flatnonzero(data == 35)
+    mask = numpy.zeros(size, dtype=bool)
+    if not len(hashes):
+        return mask
+
+    lines = numpy.searchsorted(breaks, hashes)
+    first = numpy.ones(len(hashes), dtype=bool)
+    first[1:] = lines[1:] != lines[:-1]
+
+    delta = numpy.zeros(size + 1, dtype=numpy.int8)
+    delta[hashes[first]] = 1
+    delta[numpy.append(breaks, size)[lines[first]]] = -1
+    return numpy.cumsum(delta[:size], dtype=numpy.int8).astype(bool)
+
+
+def findItems(data, specialSymbols):
+    """
+    returns the start and end offsets of the runs of token bytes and of the
+    special symbols outside of comments in source order, and which of them
+    are special symbols
+    """
+    kinds = buildKinds(specialSymbols)[data]
+    kinds[commentMask(data)] = BLANK
+
+    edges = numpy.flatnonzero(numpy.diff((kinds == RUN).view(numpy.int8), prepend=0, append=0))
+    symbols = numpy.flatnonzero(kinds == SYMBOL)
+
+    starts = numpy.concatenate((edges[0::2], symbols))
+    ends = numpy.concatenate((edges[1::2], symbols + 1))
+    isSymbol = numpy.concatenate((numpy.zeros(len(edges) // 2, dtype=bool), numpy.ones(len(symbols), dtype=bool)))
+    order = numpy.argsort(starts, kind="stable")
+    return starts[order], ends[order], isSymbol[order]
+
+
+def countIn(indicator, starts, ends):
+    """
+    returns, for every item, the number of true values of indicator between
+    its start and end offsets
+    """
+    if not len(starts):
+        return numpy.zeros(0, dtype=numpy.int64)
+    padded = numpy.append(indicator, False)  # reduceat offsets must be in range
+    bounds = numpy.empty(2 * len(starts), dtype=numpy.int64)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    return numpy.add.reduceat(padded, bounds, dtype=numpy.int64)[0::2]
+
+
+def classifySymbols(data, starts, transitions, accepts):
+    """
+    returns which special symbols are a single token, with their type, terminal
+    and error codes. a symbol is not when the DFA goes on with the next byte,
+    like = in =>
+    """
+    startRow = numpy.array(transitions[START], dtype=numpy.int64)
+    extends = numpy.zeros((COLUMNS, COLUMNS), dtype=bool)
+    typeCodes = numpy.full(COLUMNS, INVALID, dtype=numpy.int8)
+    terminalCodes = numpy.full(COLUMNS, Terminal.UNKNOWN, dtype=numpy.int8)
+    errorCodes = numpy.zeros(COLUMNS, dtype=numpy.int8)
+    for byte in range(COLUMNS):
+        state = transitions[START][byte]
+        if state != STOP:
+            extends[byte] = numpy.array(transitions[state]) != STOP
+            typeCode, code, error = accepts[state]
+            typeCodes[byte] = typeCode
+            terminalCodes[byte] = code
+            errorCodes[byte] = error.value if error else 0
+
+    values = data[starts]
+    following = data[numpy.minimum(starts + 1, len(data) - 1)]
+    single = (startRow[values] != STOP) & ~(extends[values, following] & (starts + 1 < len(data)))
+    return single, typeCodes[values], terminalCodes[values], errorCodes[values]
+
+
+def scanVectorized(sourceFile):
+    """
+    scan a source file (path or bytes buffer) with the NumPy pre-pass,
+    returns a TokenBuffer equal to the one of the sequential scanner
+    """
+    if numpy is None:
+        raise ImportError("the vectorized scanner needs NumPy (pip install numpy)")
+
+    Scanner.loadTables()
+    transitions = Scanner.transitions
+    accepts = Scanner.accepts
+    keywords = dict((keyword.encode("ascii"), TERMINAL_CODES[keyword]) for keyword in Scanner.keywords)
+    charClasses = CHAR_CLASSES
+
+    source = openSource(sourceFile)
+    if isinstance(source, bytearray):
+        source = bytes(source)
+    tokens = TokenBuffer(source)
+    size = len(source)
+    if not size:
+        tokens.append(EOF, Terminal.END, None, 0, 0)
+        return tokens
+
+    data = numpy.frombuffer(source, dtype=numpy.uint8)
+    classes = numpy.frombuffer(charClasses, dtype=numpy.uint8)[data]
+    starts, ends, isSymbol = findItems(data, Scanner.specialSymbols)
+    first = classes[starts]
+
+    # type, terminal and error codes of the items that are a single token
+    types = numpy.full(len(starts), INVALID, dtype=numpy.int8)
+    codes = numpy.full(len(starts), Terminal.UNKNOWN, dtype=numpy.int8)
+    errors = numpy.zeros(len(starts), dtype=numpy.int8)
+
+    # a run starting with a letter is one keyword, identifier or invalid token
+    words = (first == LETTER) & ~isSymbol
+    wordChar = (classes == LETTER) | (classes == DIGIT) | (classes == PERIOD)
+    invalid = numpy.zeros(len(starts), dtype=bool)
+    invalid[words] = countIn(~wordChar, starts[words], ends[words]) > 0
+    types[words & ~invalid] = ID
+    codes[words & ~invalid] = Terminal.ID
+    itemStarts, itemEnds = starts.tolist(), ends.tolist()
+    candidates = numpy.flatnonzero(words & ~invalid & (ends - starts <= max(map(len, keywords))))
+    found = numpy.array([keywords.get(source[itemStarts[i]:itemEnds[i]], -1) for i in candidates.tolist()],
+                        dtype=numpy.int8)
+    types[candidates[found >= 0]] = KEY
+    codes[candidates[found >= 0]] = found[found >= 0]
+    for i in numpy.flatnonzero(words & invalid).tolist():
+        word = source[itemStarts[i]:itemEnds[i]]
+        if word[:WORD.match(word).end()] in keywords:
+            errors[i] = LexicalError.InvalidSyntax.value
+        else:
+            errors[i] = LexicalError.InvalidIdentifier.value
+
+    # a run starting with a digit is one constant or invalid token
+    numbers = (first == DIGIT) & ~isSymbol
+    numberStarts, numberEnds = starts[numbers], ends[numbers]
+    invalid[numbers] = ((countIn((classes != DIGIT) & (classes != PERIOD), numberStarts, numberEnds) > 0) |
+                        (countIn(classes == PERIOD, numberStarts, numberEnds) > 1))
+    types[numbers & ~invalid] = CONST
+    codes[numbers & ~invalid] = Terminal.CONST
+    for i in numpy.flatnonzero(numbers & invalid).tolist():
+        number = source[itemStarts[i]:itemEnds[i]]
+        if number[NUMBER.match(number).end()] == 46:  # period
+            errors[i] = LexicalError.MultipleDecimals.value
+        else:
+            errors[i] = LexicalError.InvalidConstant.value
+
+    # special symbols, anything else goes through the DFA one token at a time
+    single, symbolTypes, symbolCodes, symbolErrors = classifySymbols(data, starts, transitions, accepts)
+    single &= isSymbol
+    types[single] = symbolTypes[single]
+    codes[single] = symbolCodes[single]
+    errors[single] = symbolErrors[single]
+    slow = numpy.flatnonzero(~words & ~numbers & ~single).tolist()
+
+    append = tokens.append
+    unknown, identifier, constant = int(Terminal.UNKNOWN), int(Terminal.ID), int(Terminal.CONST)
+
+    def scanItem(position, end):
+        # scan the tokens starting in [position, end), the last one may go past end
+        while position < end:
+            charClass = charClasses[source[position]]
+            if charClass == LETTER or charClass == DIGIT:
+                # rest of a run after an unrecognized symbol
+                run = source[position:end]
+                if charClass == LETTER:
+                    valid = WORD.match(run).end()
+                    if valid == len(run):
+                        if run in keywords:
+                            append(KEY, keywords[run], None, position, end)
+                        else:
+                            append(ID, identifier, None, position, end)
+                    elif run[:valid] in keywords:
+                        append(INVALID, unknown, LexicalError.InvalidSyntax, position, end)
+                    else:
+                        append(INVALID, unknown, LexicalError.InvalidIdentifier, position, end)
+                else:
+                    valid = NUMBER.match(run).end()
+                    if valid == len(run):
+                        append(CONST, constant, None, position, end)
+                    elif run[valid] == 46:  # period
+                        append(INVALID, unknown, LexicalError.MultipleDecimals, position, end)
+                    else:
+                        append(INVALID, unknown, LexicalError.InvalidConstant, position, end)
+                return end
+
+            start = position
+            state = START
+            while position < size:
+                nextState = transitions[state][source[position]]
+                if nextState == STOP:
+                    break
+                state = nextState
+                position += 1
+            typeCode, code, error = accepts[state]
+            append(typeCode, code, error, start, position)
+        return position
+
+    def copyItems(low, high):
+        # append the single token items low to high to the buffer
+        if low < high:
+            tokens.types.frombytes(types[low:high].tobytes())
+            tokens.codes.frombytes(codes[low:high].tobytes())
+            tokens.errors.frombytes(errors[low:high].tobytes())
+            tokens.starts.frombytes(starts[low:high].astype(numpy.int64).tobytes())
+            tokens.ends.frombytes(ends[low:high].astype(numpy.int64).tobytes())
+
+    count = len(itemStarts)
+    copied = 0  # items before this one are in the buffer
+    for i in slow:
+        if i < copied:
+            continue  # taken by the token of a previous item
+        copyItems(copied, i)
+
+        position = itemStarts[i]
+        while True:
+            taken = scanItem(position, itemEnds[i])
+            # drop the items the last token went over, scan again the rest of one
+            # it ends in
+            i += 1
+            while i < count and itemEnds[i] <= taken:
+                i += 1
+            if i < count and itemStarts[i] < taken:
+                position = taken
+                continue
+            break
+        copied = i
+    copyItems(copied, count)
+
+    tokens.append(EOF, Terminal.END, None, size, size)
+    return tokens